@@ -1,61 +1,139 @@
 import os
 import time
-import mariadb
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, render_template, request, session, redirect, url_for
-from chroma_rag import index_schema_in_chroma, retrieve_schema_context
-from llm_engine import ask_llm
-from query_executor import extract_sql, run_query
+from flask import Flask, abort, jsonify, render_template, request, session, redirect, url_for
+import db_driver
+from backends import preload
+from chroma_rag import (
+    add_examples,
+    embed_texts,
+    index_schema_in_chroma,
+    retrieve_examples,
+    retrieve_schema_context,
+    seed_gold_examples,
+)
+from llm_engine import warm_llm
+from materialized_answers import (
+    EVENT_EXECUTED,
+    MATERIALIZE,
+    get_answer,
+    log_request,
+    make_db_key,
+    refresh_in_background,
+    register_login,
+    stale_reason,
+    unregister_login,
+)
+from model_router import MODEL_LADDER, classify_question, generate_routed_sql, get_all_stats, route_model
+from query_jobs import JobLimitError, cancel_job, get_job, load_job_results, submit_job
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "supersecret_change_in_production")
 
-MAIN_LLM_MODEL = "llama3.1:8b"
 EMBEDDING_MODEL = "mxbai-embed-large:latest"
 
+# Number of SQL candidates generated in parallel per question (first valid one wins)
+SQL_CANDIDATES = int(os.getenv("QUERYMIND_SQL_CANDIDATES", "1"))
 
-def connect_to_db():
-    """Connect using session credentials"""
+# Validate generated SQL with EXPLAIN and let the LLM repair it using the database error
+SQL_REPAIR = os.getenv("QUERYMIND_SQL_REPAIR", "0") == "1"
+
+# Number of similar verified question->SQL pairs added to the prompt (0 disables few-shot)
+FEW_SHOT_EXAMPLES = int(os.getenv("QUERYMIND_FEW_SHOT_EXAMPLES", "3"))
+
+# Import heavy backends and warm the smallest LLM in the background at startup
+PRELOAD = os.getenv("QUERYMIND_PRELOAD", "0") == "1"
+
+# Runs independent pipeline stages (schema load, LLM warm-up, DB checkout) concurrently
+PIPELINE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("QUERYMIND_PIPELINE_WORKERS", "8")),
+    thread_name_prefix="pipeline"
+)
+
+
+def warm_up():
+    """Preload chromadb, ollama and the DB driver and warm the smallest LLM.
+
+    Backends are otherwise imported on first use. Call this from a server
+    worker hook (e.g. gunicorn post_worker_init) or set QUERYMIND_PRELOAD=1.
+    """
+    load_times = preload()
+    print(f"Backends preloaded: {load_times}")
+    warm_llm(MODEL_LADDER[0])
+
+
+if PRELOAD:
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
+def get_db_params():
+    """Build db_driver.connect keyword arguments from session credentials"""
     if not all(k in session for k in ['db_host', 'db_user', 'db_password', 'db_name', 'db_port']):
         return None
     
+    return {
+        "host": session['db_host'],
+        "port": int(session['db_port']),
+        "user": session['db_user'],
+        "password": session['db_password'],
+        "database": session['db_name']
+    }
+
+
+def get_job_owner():
+    """Identify the session user for query job limits and access checks"""
+    return f"{session['db_user']}@{session['db_host']}:{session['db_port']}/{session['db_name']}"
+
+
+def get_db_key():
+    """Identify the session's database login for materialized answers"""
+    return make_db_key(session['db_user'], session['db_host'], int(session['db_port']), session['db_name'])
+
+
+def connect_to_db(db_params=None, pooled=True):
+    """Connect using session credentials, or explicit db_params outside a request"""
+    if db_params is None:
+        db_params = get_db_params()
+    if not db_params:
+        return None
+    
     try:
-        return mariadb.connect(
-            host=session['db_host'],
-            port=int(session['db_port']),
-            user=session['db_user'],
-            password=session['db_password'],
-            database=session['db_name']
-        )
+        return db_driver.connect(db_params, pooled=pooled)
     except Exception as e:
         print(f"Connection error: {e}")
         return None
 
 
-def load_schema_from_session():
-    """Load schema using session credentials"""
-    conn = connect_to_db()
+def load_tables_from_session(db_params=None):
+    """List table names only (cheaper than load_schema_from_session) for the sidebar"""
+    conn = connect_to_db(db_params)
     if not conn:
-        return None
+        return []
     
     try:
-        cursor = conn.cursor()
-        cursor.execute("SHOW TABLES;")
-        tables = [row[0] for row in cursor.fetchall()]
-
-        schema_text = ""
-        for table in tables:
-            cursor.execute(f"SHOW CREATE TABLE `{table}`;")
-            result = cursor.fetchone()
-            if result and len(result) > 1:
-                schema_text += f"{result[1]};\n\n"
-        
-        cursor.close()
+        return db_driver.list_tables(conn)
+    except Exception as error:
+        print(f"Table list error: {error}")
+        return []
+    finally:
         conn.close()
-        return schema_text, tables
+
+
+def load_schema_from_session(db_params=None):
+    """Load schema using session credentials, or explicit db_params outside a request"""
+    conn = connect_to_db(db_params)
+    if not conn:
+        return None, []
+    
+    try:
+        return db_driver.load_schema(conn)
     except Exception as error:
         print(f"Schema load error: {error}")
         return None, []
+    finally:
+        conn.close()
 
 
 @app.route("/login", methods=["GET", "POST"])
@@ -76,13 +154,13 @@ def login():
         
         # Test connection
         try:
-            test_conn = mariadb.connect(
-                host=db_host,
-                port=int(db_port),
-                user=db_user,
-                password=db_password,
-                database=db_name
-            )
+            test_conn = db_driver.connect({
+                "host": db_host,
+                "port": int(db_port),
+                "user": db_user,
+                "password": db_password,
+                "database": db_name
+            })
             test_conn.close()
             
             # Store in session
@@ -94,25 +172,25 @@ def login():
             session['logged_in'] = True
             
             # Index schema with unique absolute path per user
-            schema_text, tables = load_schema_from_session()
+            schema_text, _ = load_schema_from_session()
             if schema_text:
                 # Use unique path for each user/database combination
-                import hashlib
-                unique_id = hashlib.md5(f"{db_user}_{db_host}_{db_name}".encode()).hexdigest()[:8]
                 base_dir = os.path.expanduser("~/.querymind_chromadb")
-                persist_path = os.path.join(base_dir, unique_id)
+                persist_path = os.path.join(base_dir, get_db_key())
                 session['persist_path'] = persist_path
                 
                 print(f"Indexing schema at: {persist_path}")
                 try:
                     index_schema_in_chroma(schema_text, persist_path=persist_path, model=EMBEDDING_MODEL)
+                    if FEW_SHOT_EXAMPLES:
+                        seed_gold_examples(schema_text, persist_path=persist_path, model=EMBEDDING_MODEL)
                 except Exception as e:
                     print(f"ChromaDB indexing error (non-fatal): {e}")
                     # Continue anyway - the error is handled in chroma_rag.py
             
             return redirect(url_for('home'))
             
-        except mariadb.Error as e:
+        except db_driver.driver().Error as e:
             # Generic error message for security - don't reveal specific details
             error = "Invalid database credentials. Please check your information and try again."
             print(f"Login failed: {str(e)}")  # Log actual error server-side only
@@ -128,6 +206,8 @@ def login():
 
 @app.route("/logout")
 def logout():
+    if MATERIALIZE and session.get('logged_in'):
+        unregister_login(get_db_key())
     session.clear()
     return redirect(url_for('login'))
 
@@ -143,26 +223,87 @@ def get_table_metadata(table_name):
         return {"error": "Could not connect to database"}, 500
     
     try:
-        cursor = conn.cursor()
-        # Get column information
-        cursor.execute(f"DESCRIBE `{table_name}`;")
-        columns = cursor.fetchall()
-        
-        metadata = []
-        for col in columns:
-            metadata.append({
-                "column": col[0],
-                "type": col[1],
-                "null": col[2],
-                "key": col[3] if col[3] else "-",
-                "default": str(col[4]) if col[4] is not None else "-"
-            })
-        
-        cursor.close()
-        conn.close()
+        metadata = db_driver.describe_table(conn, table_name)
         return {"table": table_name, "columns": metadata}
     except Exception as e:
         return {"error": str(e)}, 500
+    finally:
+        conn.close()
+
+
+def render_home(user_input, error, accessible_tables):
+    return render_template(
+        "home.html",
+        user_input=user_input,
+        error=error,
+        llm_model=" / ".join(MODEL_LADDER),
+        db_name=session['db_name'],
+        db_user=session['db_user'],
+        db_host=session['db_host'],
+        db_port=session['db_port'],
+        tables=accessible_tables
+    )
+
+
+def close_when_ready(conn_future):
+    """Close a connection checked out in the background that is no longer needed"""
+    def _close(future):
+        conn = future.result()
+        if conn:
+            conn.close()
+    conn_future.add_done_callback(_close)
+
+
+def load_materialized_answer(db_key, user_input, db_params):
+    """Return (answer, stale_reason) for a pinned question, or (None, None) to run the full pipeline.
+
+    Stale answers (tables changed or TTL expired) are served as they are and
+    refreshed in the background, so a slow pinned query never blocks the request.
+    """
+    answer = get_answer(db_key, user_input)
+    if not answer or answer.get("results") is None:
+        return None, None
+
+    conn = connect_to_db(db_params)
+    if not conn:
+        return None, None
+    
+    try:
+        reason = stale_reason(answer, conn)
+        if reason:
+            refresh_in_background(answer, db_params)
+        return answer, reason
+    except Exception as e:
+        print(f"Materialized answer lookup failed: {e}")
+        return None, None
+    finally:
+        conn.close()
+
+
+def render_materialized(user_input, answer, stale, time_lookup):
+    return render_template(
+        "result.html",
+        job_status="done",
+        user_input=user_input,
+        llm_model=" / ".join(MODEL_LADDER),
+        sql_query=answer["sql"],
+        results=answer["results"],
+        error="",
+        materialized=True,
+        refreshed_at=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(answer["refreshed_at"])),
+        answer_age=int(time.time() - answer["refreshed_at"]),
+        answer_stale=stale,
+        db_name=session['db_name'],
+        db_user=session['db_user'],
+        db_host=session['db_host'],
+        db_port=session['db_port'],
+        time_rag=0,
+        time_llm=0,
+        time_repair=0,
+        attempts=1,
+        time_generation=0,
+        time_execution=time_lookup
+    )
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -174,111 +315,213 @@ def home():
     error = ""
     user_input = ""
     
-    # Get accessible tables and schema
-    schema_text, accessible_tables = load_schema_from_session()
-    
     if request.method == "POST":
         user_input = request.form.get("user_input", "").strip()
+        db_params = get_db_params()
+        db_key = get_db_key()
+
+        # Frequent questions are answered from their precomputed results unless a live run is requested
+        if MATERIALIZE:
+            log_request(db_key, user_input)
+            register_login(db_key, db_params)
+            if request.form.get("force_live") != "1":
+                time_start_lookup = time.time()
+                answer, stale = load_materialized_answer(db_key, user_input, db_params)
+                if answer:
+                    return render_materialized(user_input, answer, stale, round(time.time() - time_start_lookup, 3))
+
+        # LLM warm-up does not depend on retrieval - start it now.
+        # The warm-up routes on the question alone; the final route also uses the schema context.
+        PIPELINE_EXECUTOR.submit(warm_llm, route_model(classify_question(user_input)["complexity"]))
 
         time_start_rag = time.time()
+        try:
+            question_embedding = embed_texts([user_input], model=EMBEDDING_MODEL)[0]
+        except Exception as e:
+            print(f"Question embedding failed: {e}")
+            question_embedding = None
+        
         rag_context = retrieve_schema_context(
             user_input, 
             persist_path=session['persist_path'], 
-            model=EMBEDDING_MODEL
+            model=EMBEDDING_MODEL,
+            question_embedding=question_embedding
         )
         
         # If schema not indexed, re-index automatically
-        if rag_context.startswith("ERROR:") and schema_text:
-            print("Schema not indexed, re-indexing now...")
-            try:
-                index_schema_in_chroma(schema_text, persist_path=session['persist_path'], model=EMBEDDING_MODEL)
-                # Retry retrieval after re-indexing
-                rag_context = retrieve_schema_context(
-                    user_input, 
-                    persist_path=session['persist_path'], 
-                    model=EMBEDDING_MODEL
-                )
-            except Exception as e:
-                print(f"Re-indexing failed: {e}")
+        if rag_context.startswith("ERROR:"):
+            schema_text, _ = load_schema_from_session(db_params)
+            if schema_text:
+                print("Schema not indexed, re-indexing now...")
+                try:
+                    index_schema_in_chroma(schema_text, persist_path=session['persist_path'], model=EMBEDDING_MODEL)
+                    # Retry retrieval after re-indexing
+                    rag_context = retrieve_schema_context(
+                        user_input, 
+                        persist_path=session['persist_path'], 
+                        model=EMBEDDING_MODEL,
+                        question_embedding=question_embedding
+                    )
+                except Exception as e:
+                    print(f"Re-indexing failed: {e}")
+        
+        examples = []
+        if FEW_SHOT_EXAMPLES:
+            examples = retrieve_examples(
+                user_input,
+                top_k=FEW_SHOT_EXAMPLES,
+                persist_path=session['persist_path'],
+                model=EMBEDDING_MODEL,
+                question_embedding=question_embedding
+            )
         
         time_end_rag = time.time()
         
-        time_start_llm = time.time()
-        llm_output = ask_llm(user_input, rag_context, model_name=MAIN_LLM_MODEL)
-        time_end_llm = time.time()
+        # Open the database connection while the LLM is generating. It is not pooled because
+        # the query job takes it over, and cancelling the job kills queries on it.
+        conn_future = PIPELINE_EXECUTOR.submit(connect_to_db, db_params, False)
         
-        sql_query = extract_sql(llm_output)
+        generation = generate_routed_sql(
+            user_input,
+            rag_context,
+            get_connection=conn_future.result,
+            examples=examples,
+            num_candidates=SQL_CANDIDATES,
+            repair=SQL_REPAIR
+        )
+        sql_query = generation["sql_query"]
         
         time_rag = round(time_end_rag - time_start_rag, 3)
-        time_llm = round(time_end_llm - time_start_llm, 3)
-        time_total_generation = round(time_rag + time_llm, 3)
-
-        if sql_query.startswith("Error:"):
-            error = sql_query
-            return render_template(
-                "home.html",
-                user_input=user_input,
-                error=error,
-                db_name=session['db_name'],
-                db_user=session['db_user'],
-                db_host=session['db_host'],
-                db_port=session['db_port'],
-                tables=accessible_tables
-            )
+        time_llm = generation["time_llm"]
+        time_repair = generation["time_repair"]
+        time_total_generation = round(time_rag + time_llm + time_repair, 3)
+
+        if generation["error"]:
+            close_when_ready(conn_future)
+            error = generation["error"]
+            accessible_tables = load_tables_from_session(db_params)
+            return render_home(user_input, error, accessible_tables)
 
-        conn = connect_to_db()
+        conn = conn_future.result()
         if not conn:
             error = "Could not connect to the database."
-            return render_template(
-                "home.html",
-                user_input=user_input,
-                error=error,
-                db_name=session['db_name'],
-                db_user=session['db_user'],
-                db_host=session['db_host'],
-                db_port=session['db_port'],
-                tables=accessible_tables
-            )
-        
+            return render_home(user_input, error, [])
+
+        attempts = generation["attempts"]
+        meta = {
+            "user_input": user_input,
+            "llm_model": generation["model"],
+            "complexity": generation["complexity"],
+            "models_tried": generation["models_tried"],
+            "time_rag": time_rag,
+            "time_llm": time_llm,
+            "time_repair": time_repair,
+            "time_generation": time_total_generation,
+            "attempts": max(len(attempts), len(generation["models_tried"])),
+            "attempt_log": attempts
+        }
+        persist_path = session['persist_path']
+        def remember_success(executed_sql):
+            # Queries that returned rows can be materialized and become few-shot examples
+            if MATERIALIZE:
+                log_request(db_key, user_input, sql=executed_sql, event=EVENT_EXECUTED)
+            if FEW_SHOT_EXAMPLES:
+                add_examples([{"question": user_input, "sql": executed_sql}], persist_path=persist_path, model=EMBEDDING_MODEL)
+
         try:
-            time_start_exec = time.time()
-            results = run_query(sql_query, conn)
-            time_end_exec = time.time()
-            time_execution = round(time_end_exec - time_start_exec, 3)
-        except Exception as e:
-            error = f"Error executing query: {str(e)}"
-            results = ""
-            time_execution = 0
-        finally:
-            conn.close()
+            job_id = submit_job(
+                sql_query, db_params, get_job_owner(), meta=meta, conn=conn,
+                on_success=remember_success if MATERIALIZE or FEW_SHOT_EXAMPLES else None
+            )
+        except JobLimitError as e:
+            if conn:
+                conn.close()
+            error = str(e)
+            accessible_tables = load_tables_from_session(db_params)
+            return render_home(user_input, error, accessible_tables)
 
-        return render_template(
-            "result.html",
-            user_input=user_input,
-            sql_query=sql_query,
-            results=results,
-            error=error,
-            db_name=session['db_name'],
-            db_user=session['db_user'],
-            db_host=session['db_host'],
-            db_port=session['db_port'],
-            time_rag=time_rag,
-            time_llm=time_llm,
-            time_generation=time_total_generation,
-            time_execution=time_execution
-        )
+        # Redirect so that reloading the page polls the job instead of re-running the LLM
+        return redirect(url_for('job_result', job_id=job_id))
+
+    # Get accessible tables for the sidebar
+    accessible_tables = load_tables_from_session()
+
+    return render_home(user_input, error, accessible_tables)
 
+
+@app.route("/jobs/<job_id>")
+def job_result(job_id):
+    """Show the status of a query job, or its results once finished"""
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    
+    job = get_job(job_id, get_job_owner())
+    if not job:
+        abort(404)
+    
+    results = ""
+    if job["status"] == "done":
+        results = load_job_results(job_id, get_job_owner())
+        if results is None:
+            job["error"] = "Results are no longer available. Please run the query again."
+            results = ""
+    elif job["status"] == "cancelled":
+        job["error"] = "Query was cancelled."
+    
+    meta = job["meta"]
     return render_template(
-        "home.html",
-        user_input=user_input,
-        error=error,
+        "result.html",
+        job_id=job_id,
+        job_status=job["status"],
+        user_input=meta.get("user_input", ""),
+        llm_model=meta.get("llm_model", ""),
+        sql_query=job["sql_query"],
+        results=results,
+        error=job["error"],
         db_name=session['db_name'],
         db_user=session['db_user'],
         db_host=session['db_host'],
         db_port=session['db_port'],
-        tables=accessible_tables
+        time_rag=meta.get("time_rag", 0),
+        time_llm=meta.get("time_llm", 0),
+        time_repair=meta.get("time_repair", 0),
+        attempts=meta.get("attempts", 1),
+        time_generation=meta.get("time_generation", 0),
+        time_execution=job["time_execution"]
     )
 
 
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    """API endpoint to poll the status of a query job"""
+    if not session.get('logged_in'):
+        return {"error": "Not authenticated"}, 401
+    
+    job = get_job(job_id, get_job_owner())
+    if not job:
+        return {"error": "Job not found"}, 404
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    """API endpoint to cancel a running query job"""
+    if not session.get('logged_in'):
+        return {"error": "Not authenticated"}, 401
+    
+    if not cancel_job(job_id, get_job_owner(), get_db_params()):
+        return {"error": "Job not found"}, 404
+    return jsonify(get_job(job_id, get_job_owner()))
+
+
+@app.route("/api/router/stats")
+def router_stats():
+    """API endpoint with per-model latency and success stats used for routing"""
+    if not session.get('logged_in'):
+        return {"error": "Not authenticated"}, 401
+    
+    return jsonify({"models": MODEL_LADDER, "stats": get_all_stats()})
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
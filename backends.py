@@ -0,0 +1,53 @@
+"""
+=============================================================================
+BACKENDS - Lazy loading of heavy third-party backends
+=============================================================================
+
+chromadb, ollama and the database drivers are slow to import (chromadb alone
+takes seconds), so no QueryMind module imports them at load time. Code calls
+load_backend("chromadb") at the point of use instead. The first call imports
+the module and later calls return the cached module.
+
+Servers that prefer to pay the cost up front can call preload() from a worker
+start hook (see app.warm_up).
+=============================================================================
+"""
+
+import importlib
+import threading
+import time
+
+HEAVY_BACKENDS = ("chromadb", "ollama", "mariadb")
+
+_loaded = {}
+_load_times = {}
+_load_lock = threading.Lock()
+
+
+def load_backend(name):
+    """Import a backend module on first use and return it."""
+    module = _loaded.get(name)
+    if module is not None:
+        return module
+
+    with _load_lock:
+        if name not in _loaded:
+            time_start = time.time()
+            _loaded[name] = importlib.import_module(name)
+            _load_times[name] = round(time.time() - time_start, 3)
+        return _loaded[name]
+
+
+def preload(names=HEAVY_BACKENDS):
+    """Import the given backends now. Returns {name: seconds} for the ones that loaded."""
+    for name in names:
+        try:
+            load_backend(name)
+        except ImportError as e:
+            print(f"Preload of {name} failed: {e}")
+    return get_load_times()
+
+
+def get_load_times():
+    with _load_lock:
+        return dict(_load_times)
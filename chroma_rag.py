@@ -1,11 +1,24 @@
+import hashlib
+import json
 import re
-from typing import List
-import shutil
+from typing import Dict, List
 import os
-import tempfile
 
-import chromadb
-import ollama
+from backends import load_backend
+
+SCHEMA_COLLECTION = "db_schema"
+EXAMPLES_COLLECTION = "query_examples"
+GOLD_QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "experiment", "gold_questions.json")
+
+# Words in example SQL that are neither tables, aliases nor columns
+SQL_WORDS = {
+    "select", "from", "where", "join", "inner", "left", "right", "outer", "cross", "on", "using",
+    "and", "or", "not", "in", "is", "null", "like", "between", "exists", "as", "distinct",
+    "group", "by", "order", "having", "limit", "offset", "asc", "desc", "union", "all",
+    "case", "when", "then", "else", "end", "count", "sum", "avg", "min", "max",
+    "year", "month", "day", "hour", "minute", "second", "interval", "date", "true", "false",
+}
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
 
 
 def chunk_schema(schema_text: str):
@@ -25,39 +38,43 @@ def chunk_schema(schema_text: str):
     return chunks
 
 
+def schema_columns(schema_text: str) -> Dict[str, set]:
+    """Return {table: {column, ...}} (lower case) parsed from CREATE TABLE statements."""
+    return {
+        chunk["name"].lower(): {name.lower() for name in re.findall(r"^\s*`(\w+)`", chunk["content"], re.MULTILINE)}
+        for chunk in chunk_schema(schema_text)
+        if chunk["name"] != "full_schema"
+    }
+
+
 def embed_texts(texts: List[str], model: str) -> List[List[float]]:
-    response = ollama.embed(model=model, input=texts)
+    response = load_backend("ollama").embed(model=model, input=texts)
     return response["embeddings"]
 
 
 def index_schema_in_chroma(schema_text: str, persist_path: str, model: str):
-    # Clear existing ChromaDB data for this path to avoid conflicts
-    if os.path.exists(persist_path):
-        try:
-            shutil.rmtree(persist_path)
-            print(f"Cleared old ChromaDB at {persist_path}")
-        except Exception as e:
-            print(f"Warning: Could not clear {persist_path}: {e}")
-    
+    # Only the db_schema collection is rebuilt; the query_examples collection
+    # at the same path keeps the examples learned from earlier sessions that
+    # still fit the schema (see prune_examples).
     # Ensure directory exists with proper permissions
     os.makedirs(persist_path, mode=0o755, exist_ok=True)
     
     try:
-        chroma_client = chromadb.PersistentClient(path=persist_path)
+        chroma_client = load_backend("chromadb").PersistentClient(path=persist_path)
         
         # Try to delete existing collection (ignore if doesn't exist)
         try:
             existing_collections = chroma_client.list_collections()
             for col in existing_collections:
-                if col.name == "db_schema":
-                    chroma_client.delete_collection(name="db_schema")
+                if col.name == SCHEMA_COLLECTION:
+                    chroma_client.delete_collection(name=SCHEMA_COLLECTION)
                     print("Deleted existing db_schema collection")
         except Exception as e:
             print(f"Note: {e}")
         
         # Create fresh collection
         collection = chroma_client.create_collection(
-            name="db_schema",
+            name=SCHEMA_COLLECTION,
             metadata={"hnsw:space": "cosine"}
         )
 
@@ -83,13 +100,16 @@ def index_schema_in_chroma(schema_text: str, persist_path: str, model: str):
         
         print(f"✓ Schema indexed: {len(chunks)} tables.")
         
+        prune_examples(chroma_client, schema_columns(schema_text), model=model)
+        
     except Exception as e:
         print(f"Error in index_schema_in_chroma: {e}")
         # Don't raise - allow app to continue
         pass
 
 
-def retrieve_schema_context(question: str, top_k: int = 5, persist_path: str = "./chroma_db", model: str = None):
+def retrieve_schema_context(question: str, top_k: int = 5, persist_path: str = "./chroma_db", model: str = None,
+                            question_embedding: List[float] = None):
     """Retrieve relevant schema context for a question.
     
     Args:
@@ -97,6 +117,7 @@ def retrieve_schema_context(question: str, top_k: int = 5, persist_path: str = "
         top_k: Number of top relevant tables to retrieve (default 5 for better JOIN support)
         persist_path: Path to ChromaDB persistence directory
         model: Embedding model name
+        question_embedding: Precomputed embedding of the question, to avoid embedding it twice
     
     Returns:
         String containing relevant CREATE TABLE statements
@@ -105,11 +126,11 @@ def retrieve_schema_context(question: str, top_k: int = 5, persist_path: str = "
         raise ValueError("You must pass an embedding model for RAG retrieval.")
     
     try:
-        chroma_client = chromadb.PersistentClient(path=persist_path)
+        chroma_client = load_backend("chromadb").PersistentClient(path=persist_path)
         
         # Check if collection exists
         try:
-            collection = chroma_client.get_collection("db_schema")
+            collection = chroma_client.get_collection(SCHEMA_COLLECTION)
         except Exception:
             print(f"Collection 'db_schema' not found at {persist_path}. Schema needs to be re-indexed.")
             return "ERROR: Schema not indexed. Please log out and log in again to re-index the database schema."
@@ -119,7 +140,7 @@ def retrieve_schema_context(question: str, top_k: int = 5, persist_path: str = "
             print(f"Collection 'db_schema' is empty at {persist_path}. Schema needs to be re-indexed.")
             return "ERROR: Schema not indexed. Please log out and log in again to re-index the database schema."
 
-        question_emb = embed_texts([question], model=model)[0]
+        question_emb = question_embedding or embed_texts([question], model=model)[0]
         results = collection.query(
             query_embeddings=[question_emb],
             n_results=top_k,
@@ -137,4 +158,207 @@ def retrieve_schema_context(question: str, top_k: int = 5, persist_path: str = "
     
     except Exception as e:
         print(f"Error in retrieve_schema_context: {e}")
-        return f"Error retrieving schema context: {str(e)}"
\ No newline at end of file
+        return f"Error retrieving schema context: {str(e)}"
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+def _in_function_call(code: str, position: int) -> bool:
+    """True if position is inside the parentheses of a function call rather than a subquery."""
+    depth = 0
+    for index in range(position - 1, -1, -1):
+        if code[index] == ")":
+            depth += 1
+        elif code[index] == "(":
+            if depth == 0:
+                return not code[index + 1:].lstrip().upper().startswith("SELECT")
+            depth -= 1
+    return False
+
+
+def sql_tables(sql: str) -> List[str]:
+    """Return the table names referenced after FROM/JOIN in a query.
+    
+    FROM inside function calls such as EXTRACT(YEAR FROM orderDate) is ignored.
+    """
+    code = STRING_LITERAL.sub("''", sql)
+    return [
+        match.group(1)
+        for match in re.finditer(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", code, re.IGNORECASE)
+        if not _in_function_call(code, match.start())
+    ]
+
+
+def example_fits_schema(sql: str, columns: Dict[str, set], check_columns: bool = True) -> bool:
+    """Check that every table (and column) an example query references exists in the schema.
+    
+    Function names (identifiers followed by "(") are ignored. Any other
+    unknown word makes the example not fit, so a gold example written for
+    another schema is rather dropped than used. Examples learned from
+    successful runs are checked with check_columns=False.
+    """
+    tables = [table.lower() for table in sql_tables(sql)]
+    if not tables or any(table not in columns for table in tables):
+        return False
+    if not check_columns:
+        return True
+    
+    known_columns = set().union(*(columns[table] for table in tables))
+    code = STRING_LITERAL.sub(" ", sql).lower()
+    aliases = set(re.findall(r"\bas\s+`?(\w+)", code))
+    aliases.update(re.findall(r"\b(?:from|join)\s+`?\w+`?\s+(?!on\b|where\b|join\b|group\b|order\b|limit\b)`?(\w+)", code))
+    
+    for match in re.finditer(r"\b([a-z_]\w*)\b(\s*\()?", code):
+        word = match.group(1)
+        if match.group(2) or word in SQL_WORDS or word in aliases or word in tables or word in known_columns:
+            continue
+        return False
+    return True
+
+
+def _examples_collection(chroma_client, model: str):
+    return chroma_client.get_or_create_collection(
+        name=EXAMPLES_COLLECTION,
+        metadata={"hnsw:space": "cosine", "embedding_model": model}
+    )
+
+
+def prune_examples(chroma_client, columns: Dict[str, set], model: str) -> int:
+    """Drop stored examples that no longer fit the schema and re-embed the rest if the model changed.
+    
+    Embeddings from another model have a different dimension and would make
+    every query on the collection fail. Returns the number of examples dropped.
+    """
+    try:
+        collection = chroma_client.get_collection(EXAMPLES_COLLECTION)
+    except Exception:
+        return 0
+    
+    try:
+        stored = collection.get(include=["documents", "metadatas"])
+        keep = [
+            (example_id, doc, meta)
+            for example_id, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            if example_fits_schema(meta["sql"], columns, check_columns=meta.get("source") == "gold")
+        ]
+        dropped = len(stored["ids"]) - len(keep)
+        
+        if (collection.metadata or {}).get("embedding_model") != model:
+            chroma_client.delete_collection(name=EXAMPLES_COLLECTION)
+            if keep:
+                _examples_collection(chroma_client, model).add(
+                    ids=[example_id for example_id, _, _ in keep],
+                    documents=[doc for _, doc, _ in keep],
+                    metadatas=[meta for _, _, meta in keep],
+                    embeddings=embed_texts([doc for _, doc, _ in keep], model=model),
+                )
+            print(f"Re-embedded {len(keep)} examples with {model}")
+        elif dropped:
+            kept_ids = {example_id for example_id, _, _ in keep}
+            collection.delete(ids=[example_id for example_id in stored["ids"] if example_id not in kept_ids])
+        
+        if dropped:
+            print(f"Dropped {dropped} examples that no longer fit the schema")
+        return dropped
+    except Exception as e:
+        print(f"Error in prune_examples: {e}")
+        return 0
+
+
+def add_examples(examples: List[Dict], persist_path: str, model: str, source: str = "execution"):
+    """Store verified question->SQL pairs in the query_examples collection.
+    
+    Examples are keyed by their normalized question, so re-adding a question
+    replaces its SQL instead of creating a duplicate.
+    """
+    if not examples:
+        return
+    
+    try:
+        chroma_client = load_backend("chromadb").PersistentClient(path=persist_path)
+        collection = _examples_collection(chroma_client, model)
+        
+        questions = [example["question"] for example in examples]
+        embeddings = embed_texts(questions, model=model)
+        collection.upsert(
+            ids=[hashlib.md5(normalize_question(q).encode()).hexdigest() for q in questions],
+            documents=questions,
+            metadatas=[{"sql": example["sql"], "source": source} for example in examples],
+            embeddings=embeddings,
+        )
+    except Exception as e:
+        print(f"Error in add_examples: {e}")
+
+
+def seed_gold_examples(schema_text: str, persist_path: str, model: str, gold_path: str = GOLD_QUESTIONS_PATH):
+    """Seed the example store from gold_questions.json.
+    
+    Only gold queries whose tables and columns all exist in schema_text are
+    used (see example_fits_schema).
+    """
+    try:
+        with open(gold_path) as file:
+            gold_cases = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Could not read gold questions: {e}")
+        return 0
+    
+    columns = schema_columns(schema_text)
+    examples = [
+        {"question": case["question"], "sql": case["gold_sql"]}
+        for case in gold_cases
+        if example_fits_schema(case["gold_sql"], columns)
+    ]
+    add_examples(examples, persist_path=persist_path, model=model, source="gold")
+    print(f"✓ Seeded {len(examples)} gold examples.")
+    return len(examples)
+
+
+def retrieve_examples(question: str, top_k: int = 3, persist_path: str = "./chroma_db", model: str = None,
+                      question_embedding: List[float] = None, max_distance: float = 0.5,
+                      exclude_question: str = None) -> List[Dict]:
+    """Retrieve the most similar verified question->SQL pairs for few-shot prompting.
+    
+    Args:
+        question: The user's natural language question
+        top_k: Maximum number of examples to return
+        persist_path: Path to ChromaDB persistence directory
+        model: Embedding model name
+        question_embedding: Precomputed embedding of the question
+        max_distance: Cosine distance above which examples are considered unrelated
+        exclude_question: Question to leave out (used for leave-one-out experiments)
+    
+    Returns:
+        List of {"question", "sql"} dicts, most similar first
+    """
+    try:
+        chroma_client = load_backend("chromadb").PersistentClient(path=persist_path)
+        try:
+            collection = chroma_client.get_collection(EXAMPLES_COLLECTION)
+        except Exception:
+            return []
+        
+        count = collection.count()
+        if count == 0:
+            return []
+        
+        question_emb = question_embedding or embed_texts([question], model=model)[0]
+        results = collection.query(
+            query_embeddings=[question_emb],
+            n_results=min(top_k + 1, count),
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        excluded = normalize_question(exclude_question) if exclude_question else None
+        examples = []
+        for doc, meta, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+            if distance > max_distance or normalize_question(doc) == excluded:
+                continue
+            examples.append({"question": doc, "sql": meta["sql"]})
+        return examples[:top_k]
+    
+    except Exception as e:
+        print(f"Error in retrieve_examples: {e}")
+        return []
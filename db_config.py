@@ -1,4 +1,4 @@
-import mariadb
+import db_driver
 
 """
 =============================================================================
@@ -38,4 +38,4 @@ def connect_db(user=None, password=None):
         config["user"] = user
     if password:
         config["password"] = password
-    return mariadb.connect(**config)
\ No newline at end of file
+    return db_driver.connect(config)
\ No newline at end of file
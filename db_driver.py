@@ -0,0 +1,218 @@
+"""
+=============================================================================
+DB DRIVER - Single database access layer for the web app, CLI and benchmarks
+=============================================================================
+
+Every QueryMind entry point (app.py, main.py, experiment/) connects and
+introspects the schema through this module, so benchmarks measure the same
+code path as production.
+
+- Connections come from a per-credentials MariaDB ConnectionPool; close()
+  returns them to the pool. If the pool is exhausted, a direct connection
+  is opened instead. At most DB_MAX_POOLS pools are kept, and pools unused
+  for DB_POOL_IDLE_SECONDS are closed.
+- Connections whose queries may be killed (query jobs) are opened directly
+  with pooled=False, so KILL QUERY can never hit a pooled connection that
+  has since been handed to another request.
+- Metadata lookups use prepared statements (binary protocol) with bound
+  parameters.
+- Query results are streamed with an unbuffered cursor, read in batches of
+  DB_FETCH_SIZE rows and capped at DB_MAX_ROWS; callers are told when a
+  result was truncated.
+=============================================================================
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from backends import load_backend
+
+DB_DRIVER = os.getenv("QUERYMIND_DB_DRIVER", "mariadb")
+DB_POOL_SIZE = int(os.getenv("QUERYMIND_DB_POOL_SIZE", "5"))
+DB_MAX_POOLS = int(os.getenv("QUERYMIND_DB_MAX_POOLS", "20"))
+DB_POOL_IDLE_SECONDS = int(os.getenv("QUERYMIND_DB_POOL_IDLE", "600"))
+DB_FETCH_SIZE = int(os.getenv("QUERYMIND_DB_FETCH_SIZE", "1000"))
+DB_MAX_ROWS = int(os.getenv("QUERYMIND_DB_MAX_ROWS", "0"))
+DB_BINARY_PROTOCOL = os.getenv("QUERYMIND_DB_BINARY", "0") == "1"
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def driver():
+    """Return the DB-API driver module (imported on first use)."""
+    return load_backend(DB_DRIVER)
+
+
+def _close_pools(pools):
+    for pool in pools:
+        try:
+            pool.close()
+        except Exception as e:
+            print(f"Warning: Could not close connection pool: {e}")
+
+
+def _evict_pools(now):
+    """Remove idle pools and the least recently used ones beyond DB_MAX_POOLS. Call with _pools_lock held."""
+    evicted = []
+    for key, entry in sorted(_pools.items(), key=lambda item: item[1]["last_used"]):
+        if now - entry["last_used"] > DB_POOL_IDLE_SECONDS or len(_pools) > DB_MAX_POOLS:
+            evicted.append(_pools.pop(key)["pool"])
+    return evicted
+
+
+def _pool_for(db_params):
+    """Return the connection pool for these credentials, creating it on first use."""
+    if DB_POOL_SIZE <= 0 or not hasattr(driver(), "ConnectionPool"):
+        return None
+
+    key = hashlib.md5(repr(sorted(db_params.items())).encode()).hexdigest()[:16]
+    now = time.time()
+    with _pools_lock:
+        entry = _pools.get(key)
+        if entry is not None:
+            entry["last_used"] = now
+        evicted = _evict_pools(now)
+    _close_pools(evicted)
+    if entry is not None:
+        return entry["pool"]
+
+    # Creating a pool opens connections - do it without holding the lock
+    pool = driver().ConnectionPool(
+        pool_name=f"querymind_{key}_{int(now * 1000)}",
+        pool_size=DB_POOL_SIZE,
+        **db_params
+    )
+    with _pools_lock:
+        entry = _pools.get(key)
+        if entry is None:
+            _pools[key] = {"pool": pool, "last_used": now}
+            evicted = _evict_pools(now)
+        else:
+            entry["last_used"] = now
+            evicted = [pool]
+            pool = entry["pool"]
+    _close_pools(evicted)
+    return pool
+
+
+def connect(db_params, pooled=True):
+    """Check out a connection for db_params (pooled when the driver supports it).
+
+    Pass pooled=False for connections whose queries may be killed.
+    Raises the driver's Error if the database cannot be reached.
+    """
+    pool = _pool_for(db_params) if pooled else None
+    if pool is not None:
+        try:
+            conn = pool.get_connection()
+            if conn is not None:
+                return conn
+        except driver().PoolError as e:
+            print(f"Connection pool exhausted, opening a direct connection: {e}")
+    return driver().connect(**db_params)
+
+
+def open_cursor(connection, prepared=False, streaming=False):
+    """Open a cursor using the binary protocol for prepared statements or when configured.
+
+    A streaming cursor is unbuffered: rows are read from the server as they
+    are fetched instead of being downloaded completely by execute().
+    """
+    options = {}
+    if prepared or DB_BINARY_PROTOCOL:
+        options["prepared"] = True
+    if streaming:
+        options["buffered"] = False
+    return connection.cursor(**options)
+
+
+def fetch_rows(cursor, fetch_size=DB_FETCH_SIZE, max_rows=DB_MAX_ROWS):
+    """Read a result set in batches of fetch_size rows, stopping at max_rows (0 = no limit).
+
+    Returns (rows, truncated) where truncated is True if rows beyond max_rows were dropped.
+    """
+    rows = []
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            break
+        rows.extend(batch)
+        if max_rows and len(rows) > max_rows:
+            return rows[:max_rows], True
+    return rows, False
+
+
+def list_tables(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SHOW TABLES;")
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def load_schema(connection):
+    """Return (schema_text, tables) with the CREATE TABLE statement of every table."""
+    tables = list_tables(connection)
+    cursor = connection.cursor()
+    try:
+        schema_text = ""
+        for table in tables:
+            cursor.execute(f"SHOW CREATE TABLE `{table}`;")
+            result = cursor.fetchone()
+            if result and len(result) > 1:
+                schema_text += f"{result[1]};\n\n"
+        return schema_text, tables
+    finally:
+        cursor.close()
+
+
+def describe_table(connection, table_name):
+    """Return column metadata of a table as a list of dicts (column, type, null, key, default)."""
+    cursor = open_cursor(connection, prepared=True)
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT "
+            "FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? "
+            "ORDER BY ORDINAL_POSITION",
+            (table_name,)
+        )
+        return [
+            {
+                "column": col[0],
+                "type": col[1],
+                "null": col[2],
+                "key": col[3] if col[3] else "-",
+                "default": str(col[4]) if col[4] is not None else "-"
+            }
+            for col in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+
+
+def table_versions(connection, tables):
+    """Return {table: version} where version changes when the table's data changes.
+
+    Uses UPDATE_TIME and TABLE_ROWS from information_schema.TABLES, which is
+    cheap compared to re-running a query.
+    """
+    if not tables:
+        return {}
+    
+    cursor = open_cursor(connection, prepared=True)
+    try:
+        placeholders = ", ".join("?" for _ in tables)
+        cursor.execute(
+            "SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS "
+            "FROM information_schema.TABLES "
+            f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})",
+            tuple(tables)
+        )
+        return {row[0]: f"{row[1]}|{row[2]}" for row in cursor.fetchall()}
+    finally:
+        cursor.close()
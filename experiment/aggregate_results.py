@@ -11,13 +11,17 @@ def analyze_results_file(filepath):
     matches = sum(1 for record in data if record.get("result_match"))
     avg_context_time = mean([r.get("time_context_seconds", 0) for r in data]) if data else 0
     avg_generation_time = mean([r.get("time_generate_sql_seconds", 0) for r in data]) if data else 0
+    avg_repair_time = mean([r.get("time_repair_seconds", 0) for r in data]) if data else 0
+    avg_attempts = mean([r.get("attempts", 1) for r in data]) if data else 0
     
     return {
         "file": filepath,
         "total": total_cases,
         "result_match_rate": matches / total_cases if total_cases else 0,
         "avg_time_context": avg_context_time,
-        "avg_time_generate": avg_generation_time
+        "avg_time_generate": avg_generation_time,
+        "avg_time_repair": avg_repair_time,
+        "avg_attempts": avg_attempts
     }
 
 
@@ -51,6 +55,8 @@ def main():
         print(f"  Result match rate: {item['result_match_rate']:.2f}")
         print(f"  Avg context time: {item['avg_time_context']:.3f}s")
         print(f"  Avg generation time: {item['avg_time_generate']:.3f}s")
+        print(f"  Avg repair time: {item['avg_time_repair']:.3f}s")
+        print(f"  Avg attempts: {item['avg_attempts']:.2f}")
 
     export_summary_json(summary)
 
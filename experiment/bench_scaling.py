@@ -0,0 +1,98 @@
+"""
+=============================================================================
+SCALING BENCHMARK - chunk_schema, extract_sql and indexing vs schema size
+=============================================================================
+
+Measures how the CPU-bound parts of the pipeline scale with the number of
+tables, using the synthetic schema and the fake Ollama server (so indexing
+time excludes real embedding cost).
+
+Usage:
+    python experiment/bench_scaling.py --sizes 10 100 1000 --repeat 5
+=============================================================================
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from statistics import median
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_ollama import start_fake_ollama
+from synthetic_db import build_schema_text, table_name
+
+
+def time_call(func, repeat):
+    """Return the median wall time of repeat calls to func."""
+    timings = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - time_start)
+    return median(timings)
+
+
+def build_llm_output(schema_text, n_tables):
+    """LLM answer shaped like Qwen output: a <think> block echoing the schema, then SQL."""
+    return (
+        f"<think>\n{schema_text}\n</think>\n"
+        f"```sql\nSELECT * FROM `{table_name(n_tables - 1)}` WHERE amount > 10;\n```\n"
+        "This query selects the rows you asked for."
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='Table counts to test')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions per measurement (median is reported)')
+    parser.add_argument('--skip-indexing', action='store_true', help='Only measure chunk_schema and extract_sql')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    fake_ollama = start_fake_ollama(latency=0, embed_latency=0)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{fake_ollama.server_address[1]}"
+
+    # Imported only now so the Ollama client picks up the fake server
+    from chroma_rag import chunk_schema, index_schema_in_chroma
+    from query_executor import extract_sql
+
+    results = []
+    print(f"{'tables':>8}{'schema KB':>12}{'chunk (ms)':>14}{'extract (ms)':>14}{'index (ms)':>14}")
+    for n_tables in args.sizes:
+        schema_text = build_schema_text(n_tables)
+        llm_output = build_llm_output(schema_text, n_tables)
+
+        result = {
+            "tables": n_tables,
+            "schema_bytes": len(schema_text),
+            "chunk_schema_seconds": time_call(lambda: chunk_schema(schema_text), args.repeat),
+            "extract_sql_seconds": time_call(lambda: extract_sql(llm_output), args.repeat),
+            "index_seconds": None,
+        }
+        if not args.skip_indexing:
+            persist_path = tempfile.mkdtemp(prefix="querymind_bench_chroma_")
+            result["index_seconds"] = time_call(
+                lambda: index_schema_in_chroma(schema_text, persist_path=persist_path, model="fake-embed"),
+                args.repeat
+            )
+        results.append(result)
+
+        index_ms = f"{result['index_seconds'] * 1000:.1f}" if result["index_seconds"] is not None else "-"
+        print(f"{n_tables:>8}{len(schema_text) / 1024:>12.1f}"
+              f"{result['chunk_schema_seconds'] * 1000:>14.2f}"
+              f"{result['extract_sql_seconds'] * 1000:>14.2f}{index_ms:>14}")
+
+    fake_ollama.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+=============================================================================
+MATERIALIZED ANSWERS CHECK - Mining, pinning and staleness on SQLite
+=============================================================================
+
+Runs the materialized_answers logic against the synthetic SQLite database
+(no MariaDB, Ollama or Flask needed) in a temporary directory:
+- request logs are folded into counts and emptied
+- only questions asked MIN_COUNT times with an executed SQL are pinned
+- pinned answers hold the query results and table versions
+- stale_reason detects changed tables and expired answers
+- answers that fall out of the top questions are unpinned
+- expired files are swept
+
+Exits with code 1 if any check fails.
+
+Usage:
+    python experiment/check_materialized.py
+=============================================================================
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from synthetic_db import create_sqlite_db, install_sqlite_driver
+
+
+def main():
+    work_dir = tempfile.mkdtemp(prefix="querymind_check_materialized_")
+    os.environ["QUERYMIND_REQUEST_LOG_DIR"] = os.path.join(work_dir, "logs")
+    os.environ["QUERYMIND_ANSWERS_DIR"] = os.path.join(work_dir, "answers")
+    os.environ["QUERYMIND_MATERIALIZE_MIN_COUNT"] = "3"
+
+    db_path = os.path.join(work_dir, "synthetic.sqlite")
+    create_sqlite_db(db_path, n_tables=3, rows_per_table=10)
+    install_sqlite_driver(db_path)
+
+    # Imported only now so the module picks up the temporary directories
+    import db_driver
+    import materialized_answers as answers
+
+    failures = []
+
+    def check(name, condition):
+        print(f"{'ok' if condition else 'FAIL':<6}{name}")
+        if not condition:
+            failures.append(name)
+
+    db_key = answers.make_db_key("user", "localhost", 3306, "synthetic")
+    question = "How many rows are in table_001?"
+    sql = "SELECT COUNT(*) FROM table_001"
+
+    for _ in range(3):
+        answers.log_request(db_key, question)
+    answers.log_request(db_key, "how many rows are in table 001", sql=sql, event=answers.EVENT_EXECUTED)
+    answers.log_request(db_key, "how many rows are in table_001", sql=sql, event=answers.EVENT_EXECUTED)
+    answers.log_request(db_key, "Show table_002", sql="SELECT * FROM table_002", event=answers.EVENT_EXECUTED)
+    answers.log_request(db_key, "Rare question?")
+
+    counts = answers.fold_request_log(db_key)
+    check("log is emptied after folding", not os.path.exists(answers._log_path(db_key)))
+    frequent = answers.mine_frequent_questions(counts)
+    check("only the frequent question is mined", [item["question"] for item in frequent] == [question])
+    check("mined question has its executed SQL", frequent and frequent[0]["sql"] == sql)
+
+    answers.log_request(db_key, question)
+    counts = answers.fold_request_log(db_key)
+    check("counts accumulate across folds", answers.mine_frequent_questions(counts)[0]["count"] == 4)
+
+    result = answers.run_refresh_cycle(db_key, {})
+    check("refresh cycle pins the question", result == {"pinned": 1, "refreshed": 0})
+    answer = answers.get_answer(db_key, "how many ROWS are in table_001")
+    check("pinned answer is found for a differently written question", answer is not None)
+    check("pinned answer holds the results", answer and answer["results"]["rows"] == [[10]])
+
+    conn = db_driver.connect({})
+    check("fresh answer is not stale", answers.stale_reason(answer, conn) is None)
+    conn.sqlite.execute("INSERT INTO table_001 VALUES (99, 'new', 'alpha', 1.0, NULL, 1)")
+    conn.sqlite.commit()
+    check("changed table makes the answer stale", answers.stale_reason(answer, conn) == "tables changed")
+    answers.refresh_answer(answer, conn)
+    check("refresh stores the new results", answers.get_answer(db_key, question)["results"]["rows"] == [[11]])
+    answer["refreshed_at"] = time.time() - answers.REFRESH_TTL - 1
+    check("old answer is expired", answers.stale_reason(answer, conn) == "expired")
+
+    answers.pin_questions(db_key, [], conn)
+    check("answers that are no longer frequent are unpinned", answers.get_answer(db_key, question) is None)
+    conn.close()
+
+    answers.log_request(db_key, question)
+    check("expired files are swept", answers.sweep_expired(time.time() + answers.RETENTION_SECONDS + 1) > 0)
+    check("nothing is left after the sweep", not os.listdir(answers.LOG_DIR))
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    if failures:
+        print(f"\n{len(failures)} checks failed.")
+        sys.exit(1)
+    print("\nAll checks passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,12 @@ import time
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from chroma_rag import index_schema_in_chroma, retrieve_schema_context
+from chroma_rag import index_schema_in_chroma, retrieve_examples, retrieve_schema_context, seed_gold_examples
 from db_config import connect_db
 from llm_engine import ask_llm
-from query_executor import run_query
+from query_executor import extract_sql, run_query
 from schema_loader import load_schema
+from sql_repair import repair_sql
 
 
 def load_gold_questions(filename="gold_questions.json"):
@@ -20,13 +21,15 @@ def load_gold_questions(filename="gold_questions.json"):
         return json.load(file)
 
 
-def run_experiment(llm_model, embedding_model):
+def run_experiment(llm_model, embedding_model, repair=False, few_shot=0):
     schema_text = load_schema()
     persist_path = f"./chroma_db_{embedding_model.replace(':', '_')}"
     
     print(f"\n=== LLM: {llm_model} ===")
     print(f"Indexing with {embedding_model}...")
     index_schema_in_chroma(schema_text, persist_path=persist_path, model=embedding_model)
+    if few_shot:
+        seed_gold_examples(schema_text, persist_path=persist_path, model=embedding_model)
 
     gold_cases = load_gold_questions()
     results = []
@@ -47,13 +50,36 @@ def run_experiment(llm_model, embedding_model):
         rag_context = retrieve_schema_context(
             case["question"], persist_path=persist_path, model=embedding_model
         )
+        examples = []
+        if few_shot:
+            # Leave the question itself out so gold answers never leak into the prompt
+            examples = retrieve_examples(
+                case["question"], top_k=few_shot, persist_path=persist_path,
+                model=embedding_model, exclude_question=case["question"]
+            )
         experiment_result["time_context_seconds"] = round(time.time() - start_time, 3)
+        experiment_result["few_shot_examples"] = len(examples)
 
         start_time = time.time()
-        llm_sql = ask_llm(case["question"], rag_context, model_name=llm_model)
+        llm_sql = ask_llm(case["question"], rag_context, model_name=llm_model, examples=examples)
         experiment_result["llm_generated_sql"] = llm_sql
         experiment_result["time_generate_sql_seconds"] = round(time.time() - start_time, 3)
 
+        if repair:
+            start_time = time.time()
+            repaired_sql, repair_error, attempts = repair_sql(
+                case["question"], rag_context, extract_sql(llm_sql), conn,
+                model_name=llm_model,
+                initial_time_llm=experiment_result["time_generate_sql_seconds"]
+            )
+            if not repaired_sql.startswith("Error:"):
+                llm_sql = repaired_sql
+                experiment_result["llm_generated_sql"] = llm_sql
+            experiment_result["time_repair_seconds"] = round(time.time() - start_time, 3)
+            experiment_result["attempts"] = len(attempts)
+            experiment_result["attempt_log"] = attempts
+            experiment_result["repair_error"] = repair_error
+
         print(f"Generated SQL:\n{llm_sql}")
 
         try:
@@ -70,7 +96,8 @@ def run_experiment(llm_model, embedding_model):
         results.append(experiment_result)
         print(f"Result match: {experiment_result['result_match']}")
 
-    output_filename = f"results_{llm_model.replace(':', '_')}_{embedding_model.replace(':', '_')}.json"
+    suffix = ("_repair" if repair else "") + (f"_fewshot{few_shot}" if few_shot else "")
+    output_filename = f"results_{llm_model.replace(':', '_')}_{embedding_model.replace(':', '_')}{suffix}.json"
     with open(output_filename, "w") as file:
         json.dump(results, file, indent=2)
     print(f"\nResults saved to {output_filename}")
@@ -82,9 +109,11 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--llm', required=True, help='LLM model name (e.g., llama3.1:8b)')
     parser.add_argument('--embedding', required=True, help='Embedding model (e.g., all-minilm:latest)')
+    parser.add_argument('--repair', action='store_true', help='Validate with EXPLAIN and let the LLM repair failing SQL')
+    parser.add_argument('--few-shot', type=int, default=0, help='Number of similar gold examples in the prompt (leave-one-out)')
     args = parser.parse_args()
 
-    run_experiment(args.llm, args.embedding)
+    run_experiment(args.llm, args.embedding, repair=args.repair, few_shot=args.few_shot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+"""
+=============================================================================
+FAKE OLLAMA - Deterministic local stand-in for the Ollama HTTP API
+=============================================================================
+
+Used by the benchmarks so throughput and latency of the web pipeline can be
+measured without GPUs or real models. Implements the endpoints QueryMind
+uses:
+
+- POST /api/embed     bag-of-words hash embeddings (similar text -> similar vectors)
+- POST /api/chat      answers with a SELECT on the table named in the question
+- POST /api/generate  empty response, used for model warm-up
+
+Latency is configurable: a fixed base latency per request plus the time to
+"generate" the answer at a given number of tokens per second.
+
+Run standalone:
+    python experiment/fake_ollama.py --port 11435 --latency 0.2 --tps 40
+    OLLAMA_HOST=http://127.0.0.1:11435 python app.py
+=============================================================================
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 64
+
+
+def fake_embedding(text):
+    """Hash each word into one of EMBEDDING_DIM buckets and L2-normalize."""
+    vector = [0.0] * EMBEDDING_DIM
+    for word in re.findall(r"\w+", text.lower()):
+        bucket = int(hashlib.md5(word.encode()).hexdigest(), 16) % EMBEDDING_DIM
+        vector[bucket] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def fake_sql(prompt):
+    """Answer with a SELECT on the context table mentioned in the question (or the first one)."""
+    tables = re.findall(r"^-- Table: (\w+)", prompt, re.MULTILINE)
+    question_match = re.search(r"User Question: (.*)", prompt)
+    question = question_match.group(1).lower() if question_match else ""
+
+    table = next((name for name in tables if name.lower() in question), tables[0] if tables else "dual")
+    return f"SELECT * FROM `{table}` LIMIT 20;"
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, output_text):
+        config = self.server.config
+        tokens = max(1, len(output_text) // 4)
+        time.sleep(config["latency"] + tokens / config["tokens_per_second"])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "fake")
+        created_at = datetime.now(timezone.utc).isoformat()
+
+        if self.path == "/api/embed":
+            inputs = request.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            time.sleep(self.server.config["embed_latency"])
+            self._send_json({"model": model, "embeddings": [fake_embedding(text) for text in inputs]})
+        elif self.path == "/api/chat":
+            prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+            content = fake_sql(prompt)
+            self._simulate(content)
+            self._send_json({
+                "model": model,
+                "created_at": created_at,
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": "stop",
+            })
+        elif self.path == "/api/generate":
+            self._send_json({"model": model, "created_at": created_at, "response": "", "done": True})
+        else:
+            self._send_json({"error": f"unsupported endpoint {self.path}"}, status=404)
+
+
+def start_fake_ollama(host="127.0.0.1", port=0, latency=0.2, tokens_per_second=40.0, embed_latency=0.01):
+    """Start the fake server on a background thread and return it.
+
+    The bound address is server.server_address; pass port=0 to pick a free port.
+    """
+    server = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.config = {
+        "latency": latency,
+        "tokens_per_second": tokens_per_second,
+        "embed_latency": embed_latency,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.2, help='Base seconds per chat request')
+    parser.add_argument('--tps', type=float, default=40.0, help='Simulated generation tokens per second')
+    parser.add_argument('--embed-latency', type=float, default=0.01, help='Seconds per embed request')
+    args = parser.parse_args()
+
+    server = start_fake_ollama(args.host, args.port, args.latency, args.tps, args.embed_latency)
+    print(f"Fake Ollama listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
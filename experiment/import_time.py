@@ -0,0 +1,158 @@
+"""
+=============================================================================
+IMPORT TIME - Startup cost regression check
+=============================================================================
+
+Imports each QueryMind module in a fresh interpreter with `python -X
+importtime` and reports its cumulative import cost and its most expensive
+dependencies. The check fails (exit code 1) if:
+- a module cannot be imported (unless --allow-missing is given and the
+  error is a missing third-party package)
+- a module takes longer than --budget-ms to import, or
+- a heavy backend (chromadb, ollama, mariadb, mysql.connector) is imported at
+  module load instead of lazily through backends.load_backend
+
+Usage:
+    python experiment/import_time.py
+    python experiment/import_time.py --budget-ms 300 --top 5 --output import_times.json
+    python experiment/import_time.py --allow-missing   # without flask etc. installed
+=============================================================================
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MODULES = [
+    "app",
+    "main",
+    "chroma_rag",
+    "llm_engine",
+    "model_router",
+    "query_executor",
+    "query_jobs",
+    "materialized_answers",
+    "sql_repair",
+    "schema_loader",
+    "db_config",
+    "exp_comp",
+    "aggregate_results",
+]
+HEAVY_BACKENDS = ("chromadb", "ollama", "mariadb", "mysql")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def is_missing_package(error_line):
+    """True if an import error is a third-party package that is not installed (not a QueryMind module)."""
+    match = re.match(r"ModuleNotFoundError: No module named '([\w.]+)'", error_line)
+    if not match:
+        return False
+    top_level = match.group(1).split(".")[0]
+    return not any(
+        os.path.exists(os.path.join(directory, f"{top_level}.py"))
+        for directory in (REPO_ROOT, os.path.join(REPO_ROOT, "experiment"))
+    )
+
+
+def measure_module(module):
+    """Import module in a fresh interpreter and parse the -X importtime output."""
+    code = f"import sys; sys.path[:0] = [{REPO_ROOT!r}, {os.path.join(REPO_ROOT, 'experiment')!r}]; import {module}"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+
+    imports = []
+    other_stderr = []
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            imports.append({
+                "name": match.group(4),
+                "self_us": int(match.group(1)),
+                "cumulative_us": int(match.group(2)),
+                "level": (len(match.group(3)) - 1) // 2,
+            })
+        else:
+            other_stderr.append(line)
+
+    own_index = next((idx for idx, item in enumerate(imports) if item["name"] == module), None)
+    own = imports[own_index] if own_index is not None else None
+
+    # Direct dependencies are listed right before the module, one level deeper
+    direct = []
+    if own:
+        for item in reversed(imports[:own_index]):
+            if item["level"] <= own["level"]:
+                break
+            if item["level"] == own["level"] + 1:
+                direct.append(item)
+
+    return {
+        "module": module,
+        "ok": process.returncode == 0,
+        "error": "\n".join(other_stderr[-3:]) if process.returncode else "",
+        "cumulative_ms": round(own["cumulative_us"] / 1000, 1) if own else None,
+        "heavy_imports": sorted({
+            item["name"] for item in imports
+            if item["name"].split(".")[0] in HEAVY_BACKENDS
+        }),
+        "top_imports": sorted(direct, key=lambda item: -item["cumulative_us"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('modules', nargs='*', default=MODULES, help='Modules to check (default: all)')
+    parser.add_argument('--budget-ms', type=float, default=500.0, help='Maximum cumulative import time per module')
+    parser.add_argument('--top', type=int, default=3, help='Most expensive dependencies to list per module')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--allow-missing', action='store_true',
+                        help='Do not fail modules whose import fails only because a package is not installed')
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    for module in args.modules:
+        result = measure_module(module)
+        result["top_imports"] = result["top_imports"][:args.top]
+        results.append(result)
+
+        if not result["ok"]:
+            reason = result["error"].splitlines()[-1] if result["error"] else "?"
+            print(f"{module:<20} import failed: {reason}")
+            if not (args.allow_missing and is_missing_package(reason)):
+                failures.append(f"{module} cannot be imported: {reason}")
+            if result["heavy_imports"]:
+                failures.append(f"{module} imports {', '.join(result['heavy_imports'])} at load time")
+            continue
+
+        top = ", ".join(f"{item['name']} {item['cumulative_us'] / 1000:.1f}ms" for item in result["top_imports"])
+        print(f"{module:<20} {result['cumulative_ms']:>8.1f}ms   {top}")
+
+        if result["cumulative_ms"] > args.budget_ms:
+            failures.append(f"{module} takes {result['cumulative_ms']}ms to import (budget {args.budget_ms}ms)")
+        if result["heavy_imports"]:
+            failures.append(f"{module} imports {', '.join(result['heavy_imports'])} at load time")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if failures:
+        print("\nImport-time regressions:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\nNo import-time regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+=============================================================================
+LOAD TEST - Throughput and tail latency of the web pipeline (app.py)
+=============================================================================
+
+Runs app.py in-process against deterministic local stand-ins:
+- a fake Ollama HTTP server with configurable latency and tokens/second
+- a synthetic N-table schema in SQLite (default) or a local MariaDB
+
+Virtual users log in through /login and then ask questions through /
+concurrently, polling /api/jobs/<id> until each query finishes. The report
+contains requests per second and p50/p95/p99 latency for every HTTP step and
+for every internal pipeline stage.
+
+Usage:
+    python experiment/load_test.py --users 8 --questions 5 --tables 50
+    python experiment/load_test.py --db mariadb --db-user bench --db-password secret --db-name bench
+=============================================================================
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fake_ollama import start_fake_ollama
+from synthetic_db import create_sqlite_db, install_sqlite_driver, load_mariadb, table_name
+
+QUESTION_TEMPLATES = [
+    "Show all rows from {table}",
+    "List names in {table} with amount over 50",
+    "Count rows per category in {table}",
+    "Show the total amount in {table}",
+]
+
+_timings = defaultdict(list)
+_timings_lock = threading.Lock()
+
+
+def record(stage, seconds):
+    with _timings_lock:
+        _timings[stage].append(seconds)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def instrument(module, attribute, stage):
+    """Replace module.attribute with a wrapper that records its duration under stage."""
+    original = getattr(module, attribute)
+
+    def timed(*args, **kwargs):
+        time_start = time.time()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            record(stage, time.time() - time_start)
+
+    setattr(module, attribute, timed)
+
+
+def run_user(base_url, user_index, questions, db_fields, poll_interval):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    fields = dict(db_fields, db_user=db_fields["db_user"] or f"bench{user_index}")
+
+    time_start = time.time()
+    response = opener.open(f"{base_url}/login", urllib.parse.urlencode(fields).encode())
+    response.read()
+    record("http_login", time.time() - time_start)
+    if response.geturl().endswith("/login"):
+        record("errors_login", 1)
+        return
+
+    for question in questions:
+        time_start = time.time()
+        response = opener.open(f"{base_url}/", urllib.parse.urlencode({"user_input": question}).encode())
+        response.read()
+        time_generated = time.time()
+        record("http_generate", time_generated - time_start)
+
+        if "/jobs/" not in response.geturl():
+            record("errors_generate", 1)
+            continue
+
+        job_id = response.geturl().rsplit("/", 1)[1]
+        while True:
+            status = json.loads(opener.open(f"{base_url}/api/jobs/{job_id}").read())
+            if status.get("status") not in ("pending", "running"):
+                break
+            time.sleep(poll_interval)
+
+        time_done = time.time()
+        record("http_job_wait", time_done - time_generated)
+        record("end_to_end", time_done - time_start)
+        if status.get("status") != "done":
+            record("errors_job", 1)
+
+
+def build_questions(n_tables, count, seed):
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUESTION_TEMPLATES).format(table=table_name(rng.randrange(n_tables)))
+        for _ in range(count)
+    ]
+
+
+def print_report(duration, completed):
+    print(f"\nDuration: {duration:.2f}s")
+    print(f"Completed questions: {completed}")
+    print(f"Throughput: {completed / duration if duration else 0:.2f} questions/s")
+    print(f"\n{'Stage':<18}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage in sorted(_timings):
+        values = _timings[stage]
+        if stage.startswith("errors_"):
+            print(f"{stage:<18}{len(values):>8}")
+            continue
+        print(f"{stage:<18}{len(values):>8}"
+              f"{percentile(values, 50):>10.3f}{percentile(values, 95):>10.3f}{percentile(values, 99):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=4, help='Concurrent virtual users')
+    parser.add_argument('--questions', type=int, default=5, help='Questions per user')
+    parser.add_argument('--tables', type=int, default=20, help='Tables in the synthetic schema')
+    parser.add_argument('--rows', type=int, default=100, help='Rows per synthetic table')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='Fake LLM base latency (s)')
+    parser.add_argument('--tps', type=float, default=40.0, help='Fake LLM tokens per second')
+    parser.add_argument('--embed-latency', type=float, default=0.01, help='Fake embedding latency (s)')
+    parser.add_argument('--poll-interval', type=float, default=0.05, help='Job polling interval (s)')
+    parser.add_argument('--db', choices=['sqlite', 'mariadb'], default='sqlite')
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', type=int, default=3306)
+    parser.add_argument('--db-user', default='')
+    parser.add_argument('--db-password', default='')
+    parser.add_argument('--db-name', default='querymind_bench')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the raw timings and summary to this JSON file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="querymind_bench_")
+    # Keep the per-user vector stores (~/.querymind_chromadb) out of the real home directory
+    os.environ["HOME"] = work_dir
+
+    fake_ollama = start_fake_ollama(
+        latency=args.llm_latency, tokens_per_second=args.tps, embed_latency=args.embed_latency
+    )
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{fake_ollama.server_address[1]}"
+
+    if args.db == "sqlite":
+        db_path = os.path.join(work_dir, "bench.sqlite")
+        create_sqlite_db(db_path, args.tables, args.rows)
+        install_sqlite_driver(db_path)
+    else:
+        load_mariadb({
+            "host": args.db_host, "port": args.db_port, "user": args.db_user,
+            "password": args.db_password, "database": args.db_name
+        }, args.tables, args.rows)
+
+    # Imported only now so the Ollama client and DB driver pick up the stand-ins
+    import app as webapp
+    import query_jobs
+    from werkzeug.serving import make_server
+
+    instrument(webapp, "load_schema_from_session", "schema_load")
+    instrument(webapp, "index_schema_in_chroma", "indexing")
+    instrument(webapp, "retrieve_schema_context", "retrieval")
+    instrument(webapp, "retrieve_examples", "examples")
+    instrument(webapp, "generate_routed_sql", "generation")
+    instrument(query_jobs, "run_query", "execution")
+
+    server = make_server("127.0.0.1", 0, webapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    db_fields = {
+        "db_host": args.db_host, "db_port": str(args.db_port), "db_user": args.db_user,
+        "db_password": args.db_password, "db_name": args.db_name
+    }
+    print(f"Load test: {args.users} users x {args.questions} questions, {args.tables} tables ({args.db})")
+
+    time_start = time.time()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        futures = [
+            executor.submit(
+                run_user, base_url, user_index,
+                build_questions(args.tables, args.questions, args.seed + user_index),
+                db_fields, args.poll_interval
+            )
+            for user_index in range(args.users)
+        ]
+        for future in futures:
+            future.result()
+    duration = time.time() - time_start
+
+    server.shutdown()
+    fake_ollama.shutdown()
+
+    completed = len(_timings.get("end_to_end", []))
+    print_report(duration, completed)
+
+    if args.output:
+        summary = {
+            "config": vars(args),
+            "duration": round(duration, 3),
+            "completed": completed,
+            "rps": round(completed / duration, 3) if duration else 0,
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "p50": round(percentile(values, 50), 4),
+                    "p95": round(percentile(values, 95), 4),
+                    "p99": round(percentile(values, 99), 4),
+                }
+                for stage, values in _timings.items()
+            },
+        }
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+=============================================================================
+SYNTHETIC DB - N-table schema for benchmarks (SQLite or local MariaDB)
+=============================================================================
+
+Builds a chain of tables table_000 ... table_N where every table has a
+foreign key to the previous one, and fills them with deterministic rows.
+
+For SQLite, install_sqlite_driver() registers a small mariadb-compatible
+module that db_driver loads instead of the real connector. It answers the
+MariaDB statements QueryMind issues (SHOW TABLES, SHOW CREATE TABLE,
+information_schema.COLUMNS/TABLES, CONNECTION_ID, KILL QUERY, EXPLAIN) from the
+SQLite catalog. This is only meant for benchmark processes.
+=============================================================================
+"""
+
+import itertools
+import re
+import sqlite3
+import sys
+import threading
+import types
+
+
+def table_name(index):
+    return f"table_{index:03d}"
+
+
+def build_schema_sql(n_tables, dialect="mariadb"):
+    """Return a list of CREATE TABLE statements for the synthetic schema."""
+    suffix = " ENGINE=InnoDB DEFAULT CHARSET=utf8mb4" if dialect == "mariadb" else ""
+    statements = []
+    for index in range(n_tables):
+        columns = [
+            "`id` INT NOT NULL",
+            "`name` VARCHAR(50) NOT NULL",
+            "`category` VARCHAR(20) DEFAULT NULL",
+            "`amount` DECIMAL(10,2) DEFAULT NULL",
+            "`created_at` DATETIME DEFAULT NULL",
+            "`parent_id` INT DEFAULT NULL",
+            "PRIMARY KEY (`id`)",
+        ]
+        if index > 0:
+            columns.append(
+                f"CONSTRAINT `fk_{table_name(index)}` FOREIGN KEY (`parent_id`) "
+                f"REFERENCES `{table_name(index - 1)}` (`id`)"
+            )
+        body = ",\n  ".join(columns)
+        statements.append(f"CREATE TABLE `{table_name(index)}` (\n  {body}\n){suffix};")
+    return statements
+
+
+def build_schema_text(n_tables):
+    """Return schema text shaped like QueryMind's SHOW CREATE TABLE output."""
+    return "\n\n".join(build_schema_sql(n_tables)) + "\n\n"
+
+
+def build_rows(index, rows_per_table):
+    categories = ["alpha", "beta", "gamma", "delta"]
+    return [
+        (
+            row_id,
+            f"{table_name(index)}_item_{row_id}",
+            categories[row_id % len(categories)],
+            round(row_id * 1.25, 2),
+            f"2024-01-{row_id % 28 + 1:02d} 12:00:00",
+            row_id if index > 0 else None,
+        )
+        for row_id in range(1, rows_per_table + 1)
+    ]
+
+
+def create_sqlite_db(path, n_tables, rows_per_table=100):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    for index, statement in enumerate(build_schema_sql(n_tables, dialect="sqlite")):
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name(index)}`")
+        cursor.execute(statement)
+        cursor.executemany(
+            f"INSERT INTO `{table_name(index)}` VALUES (?, ?, ?, ?, ?, ?)",
+            build_rows(index, rows_per_table)
+        )
+    conn.commit()
+    conn.close()
+
+
+def load_mariadb(db_params, n_tables, rows_per_table=100):
+    """Create the synthetic schema in a real (local) MariaDB database."""
+    import db_driver
+
+    conn = db_driver.connect(db_params)
+    cursor = conn.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
+    for index in reversed(range(n_tables)):
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name(index)}`;")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
+    for index, statement in enumerate(build_schema_sql(n_tables, dialect="mariadb")):
+        cursor.execute(statement)
+        cursor.executemany(
+            f"INSERT INTO `{table_name(index)}` VALUES (?, ?, ?, ?, ?, ?)",
+            build_rows(index, rows_per_table)
+        )
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+_connection_ids = itertools.count(1)
+_open_connections = {}
+_open_connections_lock = threading.Lock()
+
+
+class SqliteCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.sqlite.cursor()
+        self.rows = None
+        self.description = None
+
+    def _set_rows(self, rows, columns):
+        self.rows = list(rows)
+        self.description = [(column, None, None, None, None, None, None) for column in columns]
+
+    def execute(self, sql, params=()):
+        statement = sql.strip().rstrip(";").strip()
+        upper = statement.upper()
+        self.rows = None
+
+        if upper == "SHOW TABLES":
+            sql = "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+        elif upper.startswith("SHOW CREATE TABLE"):
+            name = statement.split()[-1].strip("`")
+            self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+            self._set_rows(self.cursor.fetchall(), ["Table", "Create Table"])
+            return
+        elif "INFORMATION_SCHEMA.COLUMNS" in upper:
+            name = params[0]
+            self.cursor.execute(f"PRAGMA table_info(`{name}`)")
+            self._set_rows(
+                [(col[1], col[2], "NO" if col[3] else "YES", "PRI" if col[5] else "", col[4])
+                 for col in self.cursor.fetchall()],
+                ["COLUMN_NAME", "COLUMN_TYPE", "IS_NULLABLE", "COLUMN_KEY", "COLUMN_DEFAULT"]
+            )
+            return
+        elif "INFORMATION_SCHEMA.TABLES" in upper:
+            rows = []
+            for name in params:
+                self.cursor.execute(f"SELECT COUNT(*) FROM `{name}`")
+                rows.append((name, None, self.cursor.fetchone()[0]))
+            self._set_rows(rows, ["TABLE_NAME", "UPDATE_TIME", "TABLE_ROWS"])
+            return
+        elif upper == "SELECT CONNECTION_ID()":
+            self._set_rows([(self.connection.connection_id,)], ["CONNECTION_ID()"])
+            return
+        elif upper.startswith("KILL QUERY"):
+            target_id = int(statement.split()[-1])
+            with _open_connections_lock:
+                target = _open_connections.get(target_id)
+            if target:
+                target.sqlite.interrupt()
+            self._set_rows([], [])
+            return
+        elif upper.startswith("EXPLAIN") and not upper.startswith("EXPLAIN QUERY PLAN"):
+            sql = "EXPLAIN QUERY PLAN " + statement[len("EXPLAIN"):].strip()
+        elif upper.startswith("SET "):
+            self._set_rows([], [])
+            return
+        else:
+            sql = re.sub(r"\bNOW\(\)", "CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+
+        self.cursor.execute(sql, params)
+        self.description = self.cursor.description
+
+    def fetchall(self):
+        if self.rows is not None:
+            rows, self.rows = self.rows, []
+            return rows
+        return self.cursor.fetchall()
+
+    def fetchone(self):
+        if self.rows is not None:
+            return self.rows.pop(0) if self.rows else None
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        if self.rows is not None:
+            rows, self.rows = self.rows[:size], self.rows[size:]
+            return rows
+        return self.cursor.fetchmany(size)
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, path):
+        self.sqlite = sqlite3.connect(path, check_same_thread=False)
+        self.connection_id = next(_connection_ids)
+        with _open_connections_lock:
+            _open_connections[self.connection_id] = self
+
+    def cursor(self, **kwargs):
+        return SqliteCursor(self)
+
+    def commit(self):
+        self.sqlite.commit()
+
+    def ping(self):
+        self.sqlite.execute("SELECT 1")
+
+    def close(self):
+        with _open_connections_lock:
+            _open_connections.pop(self.connection_id, None)
+        self.sqlite.close()
+
+
+def install_sqlite_driver(path):
+    """Route every db_driver connection in this process to the SQLite database at path.
+
+    Must be called before db_driver first loads the driver. The stand-in
+    module has no ConnectionPool, so db_driver opens direct connections.
+    """
+    mariadb = types.ModuleType("mariadb")
+    mariadb.Error = sqlite3.Error
+    mariadb.connect = lambda **kwargs: SqliteConnection(path)
+    sys.modules["mariadb"] = mariadb
+    return mariadb
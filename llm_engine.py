@@ -1,5 +1,16 @@
-import ollama
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from backends import load_backend
+
+LLM_KEEP_ALIVE = os.getenv("QUERYMIND_LLM_KEEP_ALIVE", "30m")
+WARM_INTERVAL_SECONDS = 60
+
+_last_warm = {}
+_warm_lock = threading.Lock()
 
 
 def is_dangerous_query(question):
@@ -30,16 +41,18 @@ def is_dangerous_query(question):
     return False
 
 
-def ask_llm(question, rag_context, model_name):
-    # Block dangerous queries BEFORE sending to LLM
-    if is_dangerous_query(question):
-        return "Error: Only SELECT queries are allowed."
+def format_examples(examples):
+    if not examples:
+        return ""
     
-    # Check if schema context is valid before proceeding
-    if not rag_context or rag_context.startswith("ERROR:") or rag_context.startswith("Error"):
-        return f"Error: {rag_context}"
-    
-    prompt = f"""You are an expert SQL assistant for MariaDB.
+    lines = ["Examples of correct queries for this database:"]
+    for example in examples:
+        lines.append(f"Question: {example['question']}\nSQL: {example['sql']}")
+    return "\n\n".join(lines) + "\n\n"
+
+
+def build_prompt(question, rag_context, examples=None):
+    return f"""You are an expert SQL assistant for MariaDB.
 Generate a valid SQL SELECT query based on the user's question and the provided database schema.
 
 RULES:
@@ -50,21 +63,155 @@ RULES:
 Database Schema:
 {rag_context}
 
-User Question: {question}
+{format_examples(examples)}User Question: {question}
 
 SQL Query:"""
 
+
+def build_repair_prompt(question, rag_context, failed_sql, db_error):
+    return f"""The following MariaDB SELECT query failed. Fix it.
+Output ONLY the corrected raw SQL SELECT query - no explanations, no markdown.
+
+Database Schema:
+{rag_context}
+
+User Question: {question}
+
+Failed Query:
+{failed_sql}
+
+Database Error:
+{db_error}
+
+Corrected SQL Query:"""
+
+
+def clean_llm_output(content):
+    sql_query = content.strip().replace("```sql", "").replace("```", "").strip()
+    
+    if sql_query.lower().startswith("sql query:"):
+        sql_query = sql_query[10:].strip()
+    
+    return sql_query
+
+
+def check_question(question, rag_context):
+    """Return an error string if the question or schema context must not reach the LLM."""
+    # Block dangerous queries BEFORE sending to LLM
+    if is_dangerous_query(question):
+        return "Error: Only SELECT queries are allowed."
+    
+    # Check if schema context is valid before proceeding
+    if not rag_context or rag_context.startswith("ERROR:") or rag_context.startswith("Error"):
+        return f"Error: {rag_context}"
+    
+    return None
+
+
+def is_llm_error(llm_output):
+    """True if the model could not be called (e.g. model not pulled, Ollama not running)."""
+    return llm_output.startswith("LLM Error:")
+
+
+def warm_llm(model_name):
+    """Load the model into Ollama memory so the first real request skips the load.
+
+    Called concurrently with retrieval; skipped if the model was warmed recently.
+    """
+    with _warm_lock:
+        if time.time() - _last_warm.get(model_name, 0) < WARM_INTERVAL_SECONDS:
+            return
+        _last_warm[model_name] = time.time()
+    
+    try:
+        load_backend("ollama").generate(model=model_name, prompt="", keep_alive=LLM_KEEP_ALIVE)
+    except Exception as e:
+        print(f"LLM warm-up failed for {model_name}: {e}")
+
+
+def ask_llm(question, rag_context, model_name, options=None, examples=None):
+    error = check_question(question, rag_context)
+    if error:
+        return error
+    
+    prompt = build_prompt(question, rag_context, examples)
+
+    try:
+        response = load_backend("ollama").chat(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            options=options,
+            keep_alive=LLM_KEEP_ALIVE
+        )
+        return clean_llm_output(response["message"]["content"])
+    except Exception as e:
+        return f"LLM Error: {e}"
+
+
+def ask_llm_candidates(question, rag_context, model_name, num_candidates, is_valid, examples=None):
+    """Generate num_candidates SQL candidates in parallel; the first valid one wins.
+
+    The first candidate uses greedy decoding and the others sample at increasing
+    temperatures. Ollama must allow parallel requests (OLLAMA_NUM_PARALLEL) for
+    this to reduce latency.
+
+    Args:
+        question: The user's natural language question
+        rag_context: Retrieved schema context
+        model_name: Ollama model name
+        num_candidates: Number of candidates to generate concurrently
+        is_valid: Callable taking the raw LLM output and returning True if usable
+        examples: Optional few-shot question->SQL pairs for the prompt
+
+    Returns:
+        The first valid LLM output, or the first output received if none is valid
+    """
+    error = check_question(question, rag_context)
+    if error:
+        return error
+    
+    if num_candidates <= 1:
+        return ask_llm(question, rag_context, model_name, examples=examples)
+    
+    candidate_options = [{"temperature": 0.0}] + [
+        {"temperature": round(0.3 + 0.2 * idx, 2), "seed": idx}
+        for idx in range(num_candidates - 1)
+    ]
+    
+    executor = ThreadPoolExecutor(max_workers=num_candidates)
+    futures = [
+        executor.submit(ask_llm, question, rag_context, model_name, options, examples)
+        for options in candidate_options
+    ]
+    
+    first_output = None
+    try:
+        for future in as_completed(futures):
+            output = future.result()
+            if first_output is None:
+                first_output = output
+            if is_valid(output):
+                return output
+        return first_output
+    finally:
+        # Do not wait for slower candidates once a winner is found
+        executor.shutdown(wait=False)
+
+
+def ask_llm_repair(question, rag_context, failed_sql, db_error, model_name):
+    """Ask the model to correct failed_sql using the database error message."""
+    error = check_question(question, rag_context)
+    if error:
+        return error
+    
+    prompt = build_repair_prompt(question, rag_context, failed_sql, db_error)
+
     try:
-        response = ollama.chat(
+        response = load_backend("ollama").chat(
             model=model_name,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            keep_alive=LLM_KEEP_ALIVE
         )
-        sql_query = response["message"]["content"]
-        sql_query = sql_query.strip().replace("```sql", "").replace("```", "").strip()
-        
-        if sql_query.lower().startswith("sql query:"):
-            sql_query = sql_query[10:].strip()
-        
-        return sql_query
+        return clean_llm_output(response["message"]["content"])
     except Exception as e:
-        return f"LLM Error: {e}"
\ No newline at end of file
+        return f"LLM Error: {e}"
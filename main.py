@@ -22,13 +22,12 @@ To use this CLI for testing:
 =============================================================================
 """
 
-from chroma_rag import index_schema_in_chroma, retrieve_schema_context
+from chroma_rag import index_schema_in_chroma, retrieve_examples, retrieve_schema_context, seed_gold_examples
 from db_config import connect_db
-from llm_engine import ask_llm
+from model_router import generate_routed_sql
 from query_executor import run_query
 from schema_loader import load_schema
 
-MAIN_LLM_MODEL = "llama3.1:8b"
 EMBEDDING_MODEL = "mxbai-embed-large:latest"
 PERSIST_PATH = "./chroma_db"
 
@@ -36,6 +35,7 @@ PERSIST_PATH = "./chroma_db"
 def main():
     schema_text = load_schema()
     index_schema_in_chroma(schema_text, persist_path=PERSIST_PATH, model=EMBEDDING_MODEL)
+    seed_gold_examples(schema_text, persist_path=PERSIST_PATH, model=EMBEDDING_MODEL)
     conn = connect_db()
 
     try:
@@ -43,7 +43,12 @@ def main():
             user_question = input("\nType your question (or 'exit'): ").strip()
 
             rag_context = retrieve_schema_context(user_question, persist_path=PERSIST_PATH, model=EMBEDDING_MODEL)
-            sql_query = ask_llm(user_question, rag_context, model_name=MAIN_LLM_MODEL)
+            examples = retrieve_examples(user_question, persist_path=PERSIST_PATH, model=EMBEDDING_MODEL)
+            generation = generate_routed_sql(
+                user_question, rag_context, get_connection=lambda: conn, examples=examples
+            )
+            sql_query = generation["sql_query"]
+            print(f"\nModel: {generation['model']} ({generation['complexity']})")
             print(f"\nGenerated SQL:\n{sql_query}\n")
             run_query(sql_query, conn)
     finally:
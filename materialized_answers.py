@@ -0,0 +1,405 @@
+"""
+=============================================================================
+MATERIALIZED ANSWERS - Precomputed results for frequently asked questions
+=============================================================================
+
+In practice a few questions make up most traffic, and each of them would
+otherwise go through embedding, the LLM and execution on every request.
+Opt in with QUERYMIND_MATERIALIZE=1.
+
+- Every question asked, and every SQL that returned rows, is appended to a
+  per-login request log (LOG_DIR/<db_key>.jsonl)
+- Each refresh cycle folds the log into a bounded counts file and empties
+  it, so mining never re-reads old traffic. The top questions asked at
+  least MIN_COUNT times are pinned with their most frequently executed SQL
+- A pinned answer stores the SQL, its last results and the version of every
+  table it reads (information_schema.TABLES). It is refreshed when a table
+  version changes or when it is older than REFRESH_TTL
+- home() serves a pinned answer directly and shows when it was refreshed.
+  Stale answers are served marked as such and refreshed in the background
+  on REFRESH_EXECUTOR, never inside the request. The user can force a live
+  run instead
+- Logs, counts and answers not written for RETENTION_SECONDS are deleted
+
+Answers are stored per database login (db_key), so users never see results
+computed with someone else's privileges. Each process runs one refresher
+thread for the logins that used it within LOGIN_TTL_SECONDS. Credentials
+are forgotten at logout, after LOGIN_TTL_SECONDS or when they stop working.
+A lock file per login makes sure only one process runs a cycle at a time.
+Refresh can also run from cron for the CLI database:
+
+    python materialized_answers.py
+=============================================================================
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db_driver
+from chroma_rag import normalize_question, sql_tables
+from query_executor import run_query
+
+MATERIALIZE = os.getenv("QUERYMIND_MATERIALIZE", "0") == "1"
+LOG_DIR = os.getenv("QUERYMIND_REQUEST_LOG_DIR", os.path.expanduser("~/.querymind_logs"))
+ANSWERS_DIR = os.getenv("QUERYMIND_ANSWERS_DIR", os.path.expanduser("~/.querymind_answers"))
+TOP_QUESTIONS = int(os.getenv("QUERYMIND_MATERIALIZE_TOP", "20"))
+MIN_COUNT = int(os.getenv("QUERYMIND_MATERIALIZE_MIN_COUNT", "3"))
+REFRESH_TTL = int(os.getenv("QUERYMIND_MATERIALIZE_TTL", "3600"))
+REFRESH_INTERVAL = int(os.getenv("QUERYMIND_MATERIALIZE_INTERVAL", "300"))
+RETENTION_SECONDS = int(os.getenv("QUERYMIND_MATERIALIZE_RETENTION", "86400"))
+LOGIN_TTL_SECONDS = int(os.getenv("QUERYMIND_MATERIALIZE_LOGIN_TTL", "3600"))
+MAX_TRACKED_QUESTIONS = 1000
+
+EVENT_ASKED = "asked"
+EVENT_EXECUTED = "executed"
+
+# Background refreshes get their own threads so they never delay request pipelines
+REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="materialize")
+
+_log_lock = threading.Lock()
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_logins = {}
+_logins_lock = threading.Lock()
+_refresher = None
+
+
+def make_db_key(user, host, port, database):
+    """Identifier of a database login (also the ChromaDB directory name)."""
+    return hashlib.md5(f"{user}_{host}_{port}_{database}".encode()).hexdigest()[:8]
+
+
+def _log_path(db_key):
+    return os.path.join(LOG_DIR, f"{db_key}.jsonl")
+
+
+def _counts_path(db_key):
+    return os.path.join(LOG_DIR, f"{db_key}.counts.json")
+
+
+def _write_json(path, data):
+    """Write a JSON file atomically so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def log_request(db_key, question, sql=None, event=EVENT_ASKED):
+    """Append a question (or a question with the SQL that answered it) to the login's request log."""
+    record = {"ts": round(time.time(), 3), "event": event, "question": question, "sql": sql}
+    try:
+        with _log_lock:
+            os.makedirs(LOG_DIR, mode=0o700, exist_ok=True)
+            with open(_log_path(db_key), "a") as file:
+                file.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not write request log: {e}")
+
+
+def fold_request_log(db_key):
+    """Merge new request log lines into the counts file and empty the log. Returns the counts.
+
+    The log is renamed before it is read, so requests logged meanwhile go to
+    a new file. Only MAX_TRACKED_QUESTIONS questions are kept. Call with the
+    login's cycle lock held (see run_refresh_cycle).
+    """
+    counts = _read_json(_counts_path(db_key)) or {}
+    folding_path = f"{_log_path(db_key)}.folding"
+    if not os.path.exists(folding_path):
+        try:
+            os.replace(_log_path(db_key), folding_path)
+        except FileNotFoundError:
+            return counts
+
+    with open(folding_path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("question"):
+                continue
+            item = counts.setdefault(
+                normalize_question(record["question"]),
+                {"question": record["question"], "count": 0, "sql": {}}
+            )
+            if record.get("event") == EVENT_EXECUTED and record.get("sql"):
+                item["sql"][record["sql"]] = item["sql"].get(record["sql"], 0) + 1
+            else:
+                item["count"] += 1
+
+    tracked = sorted(counts.items(), key=lambda pair: -pair[1]["count"])[:MAX_TRACKED_QUESTIONS]
+    counts = dict(tracked)
+    _write_json(_counts_path(db_key), counts)
+    os.remove(folding_path)
+    return counts
+
+
+def mine_frequent_questions(counts, top_n=TOP_QUESTIONS, min_count=MIN_COUNT):
+    """Return the most frequent questions that have a successfully executed SQL.
+
+    Returns a list of {"question", "sql", "count"} sorted by count, most
+    frequent first.
+    """
+    frequent = []
+    for item in sorted(counts.values(), key=lambda item: -item["count"]):
+        if item["count"] < min_count or len(frequent) >= top_n:
+            break
+        if item["sql"]:
+            frequent.append({
+                "question": item["question"],
+                "sql": max(item["sql"], key=item["sql"].get),
+                "count": item["count"],
+            })
+    return frequent
+
+
+def _answers_dir(db_key):
+    return os.path.join(ANSWERS_DIR, db_key)
+
+
+def _answer_path(db_key, question):
+    answer_id = hashlib.md5(normalize_question(question).encode()).hexdigest()
+    return os.path.join(_answers_dir(db_key), f"{answer_id}.json")
+
+
+def get_answer(db_key, question):
+    """Return the pinned answer for question, or None if it is not materialized or too old."""
+    answer = _read_json(_answer_path(db_key, question))
+    if answer and time.time() - (answer.get("refreshed_at") or 0) > RETENTION_SECONDS:
+        return None
+    return answer
+
+
+def list_answers(db_key):
+    directory = _answers_dir(db_key)
+    if not os.path.isdir(directory):
+        return []
+    answers = (_read_json(os.path.join(directory, name)) for name in os.listdir(directory) if name.endswith(".json"))
+    return [answer for answer in answers if answer]
+
+
+def refresh_answer(entry, connection):
+    """Re-run the pinned SQL, store the new results and table versions, and return the entry.
+
+    If the query fails, the previous results are kept and the error is recorded.
+    """
+    time_start = time.time()
+    results = run_query(entry["sql"], connection)
+    time_execution = round(time.time() - time_start, 3)
+
+    if isinstance(results, str) and results.startswith("Error:"):
+        entry["error"] = results
+    else:
+        entry["results"] = results
+        entry["error"] = ""
+        entry["time_execution"] = time_execution
+        entry["refreshed_at"] = time.time()
+        entry["table_versions"] = db_driver.table_versions(connection, sql_tables(entry["sql"]))
+    _write_json(_answer_path(entry["db_key"], entry["question"]), entry)
+    return entry
+
+
+def stale_reason(entry, connection):
+    """Return why an answer needs a refresh ("tables changed", "expired") or None if it is fresh."""
+    if not entry.get("refreshed_at"):
+        return "expired"
+    versions = db_driver.table_versions(connection, sql_tables(entry["sql"]))
+    if versions != entry.get("table_versions"):
+        return "tables changed"
+    if time.time() - entry["refreshed_at"] > REFRESH_TTL:
+        return "expired"
+    return None
+
+
+def refresh_in_background(entry, db_params):
+    """Refresh an answer on REFRESH_EXECUTOR unless a refresh of it is already running."""
+    key = _answer_path(entry["db_key"], entry["question"])
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def _refresh():
+        try:
+            conn = db_driver.connect(db_params)
+            try:
+                refresh_answer(entry, conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Refresh of materialized answer failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    REFRESH_EXECUTOR.submit(_refresh)
+
+
+def pin_questions(db_key, frequent, connection):
+    """Materialize the given frequent questions and drop answers that are no longer frequent.
+
+    Returns the number of newly pinned (or re-pinned with a new SQL) answers.
+    """
+    pinned = 0
+    keep = set()
+    for item in frequent:
+        keep.add(_answer_path(db_key, item["question"]))
+        entry = _read_json(_answer_path(db_key, item["question"]))
+        if entry and entry["sql"] == item["sql"]:
+            entry["count"] = item["count"]
+            _write_json(_answer_path(db_key, item["question"]), entry)
+            continue
+
+        entry = {
+            "db_key": db_key,
+            "question": item["question"],
+            "sql": item["sql"],
+            "count": item["count"],
+            "pinned_at": time.time(),
+            "refreshed_at": None,
+            "table_versions": {},
+            "results": None,
+            "time_execution": 0,
+            "error": "",
+        }
+        refresh_answer(entry, connection)
+        pinned += 1
+
+    directory = _answers_dir(db_key)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".json") and path not in keep:
+                os.remove(path)
+    return pinned
+
+
+def refresh_stale(db_key, connection):
+    """Refresh every pinned answer of db_key whose tables changed or whose TTL expired."""
+    refreshed = 0
+    for entry in list_answers(db_key):
+        if stale_reason(entry, connection):
+            refresh_answer(entry, connection)
+            refreshed += 1
+    return refreshed
+
+
+def _acquire_cycle_lock(db_key):
+    """Take the login's cross-process cycle lock. Returns its path, or None if another process holds it."""
+    os.makedirs(LOG_DIR, mode=0o700, exist_ok=True)
+    lock_path = os.path.join(LOG_DIR, f"{db_key}.lock")
+    try:
+        # A lock older than a few intervals was left by a process that died
+        if time.time() - os.path.getmtime(lock_path) > 3 * REFRESH_INTERVAL:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+        return lock_path
+    except FileExistsError:
+        return None
+
+
+def run_refresh_cycle(db_key, db_params):
+    """Fold the request log, pin the frequent questions and refresh stale answers.
+
+    Returns None if another process is running a cycle for db_key.
+    """
+    lock_path = _acquire_cycle_lock(db_key)
+    if lock_path is None:
+        return None
+    try:
+        conn = db_driver.connect(db_params)
+        try:
+            pinned = pin_questions(db_key, mine_frequent_questions(fold_request_log(db_key)), conn)
+            refreshed = refresh_stale(db_key, conn)
+        finally:
+            conn.close()
+    finally:
+        os.remove(lock_path)
+    return {"pinned": pinned, "refreshed": refreshed}
+
+
+def sweep_expired(now=None):
+    """Delete request logs, counts and answers that were not written for RETENTION_SECONDS."""
+    now = now or time.time()
+    paths = []
+    if os.path.isdir(LOG_DIR):
+        paths += [os.path.join(LOG_DIR, name) for name in os.listdir(LOG_DIR)]
+    if os.path.isdir(ANSWERS_DIR):
+        for db_key in os.listdir(ANSWERS_DIR):
+            directory = _answers_dir(db_key)
+            if os.path.isdir(directory):
+                paths += [os.path.join(directory, name) for name in os.listdir(directory)]
+
+    removed = 0
+    for path in paths:
+        try:
+            if os.path.isfile(path) and now - os.path.getmtime(path) > RETENTION_SECONDS:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"Warning: Could not remove {path}: {e}")
+    return removed
+
+
+def _refresh_loop():
+    while True:
+        time.sleep(REFRESH_INTERVAL)
+        now = time.time()
+        with _logins_lock:
+            for db_key in [key for key, login in _logins.items() if now - login["last_seen"] > LOGIN_TTL_SECONDS]:
+                del _logins[db_key]
+            logins = list(_logins.items())
+
+        for db_key, login in logins:
+            try:
+                run_refresh_cycle(db_key, login["db_params"])
+            except db_driver.driver().Error as e:
+                # Credentials no longer work (e.g. password changed) - wait for the next request
+                print(f"Materialized answer refresh for {db_key} stopped: {e}")
+                unregister_login(db_key)
+            except Exception as e:
+                print(f"Materialized answer refresh failed: {e}")
+        sweep_expired(now)
+
+
+def register_login(db_key, db_params):
+    """Keep refreshing db_key's answers with db_params until logout or LOGIN_TTL_SECONDS of inactivity."""
+    global _refresher
+    with _logins_lock:
+        _logins[db_key] = {"db_params": dict(db_params), "last_seen": time.time()}
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name="materialize-refresher", daemon=True)
+            _refresher.start()
+
+
+def unregister_login(db_key):
+    """Stop refreshing db_key and forget its credentials."""
+    with _logins_lock:
+        _logins.pop(db_key, None)
+
+
+if __name__ == "__main__":
+    # One refresh cycle for the CLI database (db_config.DB_CONFIG), e.g. from cron
+    from db_config import DB_CONFIG
+
+    db_key = make_db_key(DB_CONFIG["user"], DB_CONFIG["host"], DB_CONFIG["port"], DB_CONFIG["database"])
+    print(run_refresh_cycle(db_key, DB_CONFIG))
+    print(f"Removed {sweep_expired()} expired files")
@@ -0,0 +1,322 @@
+"""
+=============================================================================
+MODEL ROUTER - Pick the LLM per question by complexity and latency budget
+=============================================================================
+
+Simple questions do not need an 8B model. The router classifies each
+question with cheap features of the question and its retrieved schema
+context, sends simple questions to the smallest model in MODEL_LADDER and
+complex ones to the largest, and escalates to the next larger model when
+the generated SQL fails validation.
+
+Per-model latency and success counts are recorded for every question class
+and feed back into routing:
+- a model that keeps failing a class is skipped for that class
+- a model that is too slow for the latency budget is replaced by a smaller
+  one unless the smaller one is known to fail that class
+=============================================================================
+"""
+
+import os
+import re
+import threading
+import time
+
+from llm_engine import ask_llm_candidates, check_question, is_llm_error
+from query_executor import extract_sql, validate_sql
+from sql_repair import repair_sql
+
+# Models ordered from smallest/fastest to largest/most accurate
+MODEL_LADDER = [
+    model.strip()
+    for model in os.getenv("QUERYMIND_LLM_MODELS", "gemma3:1b,llama3.1:8b").split(",")
+    if model.strip()
+]
+LATENCY_BUDGET = float(os.getenv("QUERYMIND_LATENCY_BUDGET", "0")) or None
+
+SIMPLE_COMPLEXITIES = ("simple", "simple_filter")
+MIN_SAMPLES = 5
+MIN_SUCCESS_RATE = 0.7
+
+AGGREGATION_KEYWORDS = [
+    r'\bcount\b', r'\bhow many\b', r'\bsum\b', r'\btotal\b', r'\baverage\b', r'\bavg\b',
+    r'\bper\b', r'\beach\b', r'\bgroup\b', r'\bmost\b', r'\bleast\b', r'\btop\b',
+    r'\bhighest\b', r'\blowest\b', r'\bmaximum\b', r'\bminimum\b', r'\bmax\b', r'\bmin\b',
+]
+FILTER_KEYWORDS = [
+    r'\bwhere\b', r'\bover \d', r'\bunder \d', r'\babove \d', r'\bbelow \d',
+    r'\bgreater than\b', r'\bless than\b', r'\bmore than\b', r'\bfewer than\b',
+    r'\bbefore\b', r'\bafter\b', r'\bbetween\b', r'\bequals?\b', r'\bnamed\b', r'\bcalled\b',
+]
+# Literal values in the original question: quoted strings, codes like S10_1678, proper nouns after a preposition
+VALUE_PATTERNS = [
+    r"'[^']+'", r'"[^"]+"', r'\b[A-Z]+\d+(?:[_-]\d+)?\b', r'\b(?:in|from|for|of|by) (?:the )?[A-Z][a-z]',
+]
+# Column name words that say nothing about which table a question is about
+GENERIC_COLUMN_WORDS = {"id", "number", "code", "name", "type", "date", "status", "description", "text"}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _split_identifier(name):
+    """Split a camelCase or snake_case identifier into lower-case words."""
+    return re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', name).replace("_", " ").lower().split()
+
+
+def _singular(word):
+    return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+def _context_tables(rag_context):
+    """Map each retrieved table name to its words, columns and the tables its foreign keys reference."""
+    tables = {}
+    for chunk in re.split(r'^-- Table: ', rag_context or "", flags=re.MULTILINE):
+        lines = chunk.split("\n", 1)
+        if len(lines) < 2 or not lines[0].strip():
+            continue
+        name = lines[0].strip()
+        references = re.findall(r'REFERENCES\s+`?(\w+)`?', lines[1], re.IGNORECASE)
+        tables[name.lower()] = {
+            "words": _split_identifier(name),
+            "columns": re.findall(r'^\s*`(\w+)`', lines[1], re.MULTILINE),
+            "references": {ref.lower() for ref in references},
+        }
+    return tables
+
+
+def _mentions_phrase(question_words, phrase_words):
+    """True if the phrase appears as consecutive question words (plural or prefix forms allowed)."""
+    size = len(phrase_words)
+    return size > 0 and any(
+        all(question_words[start + offset].startswith(_singular(word)) for offset, word in enumerate(phrase_words))
+        for start in range(len(question_words) - size + 1)
+    )
+
+
+def _mentions_table(question_words, table, shared_columns):
+    """True if the question names the table or one of its own (non-shared) columns.
+
+    Table names are matched word by word ("order_details", "orderDetails")
+    and as one word against adjacent question words ("productlines" matches
+    "product line"). Column names only count if no other retrieved table
+    has the same column, so foreign keys do not mark both ends as mentioned.
+    """
+    joined = _singular("".join(table["words"]))
+    if len(joined) >= 3:
+        pairs = [first + second for first, second in zip(question_words, question_words[1:])]
+        if any(word.startswith(joined) for word in question_words + pairs):
+            return True
+    if _mentions_phrase(question_words, table["words"]):
+        return True
+
+    for column in table["columns"]:
+        if column.lower() in shared_columns:
+            continue
+        words = _split_identifier(column)
+        while words and words[-1] in GENERIC_COLUMN_WORDS:
+            words.pop()
+        if len(words) >= 2 and _mentions_phrase(question_words, words):
+            return True
+    return False
+
+
+def classify_question(question, rag_context=""):
+    """Classify a question using cheap features of the question and its schema context.
+
+    Returns:
+        Dict with the features (tables_mentioned, fk_hops, aggregations,
+        filters) and a complexity label: simple, simple_filter, aggregation,
+        join or complex
+    """
+    question_lower = question.lower()
+    question_words = re.findall(r"\w+", question_lower)
+
+    context_tables = _context_tables(rag_context)
+    column_counts = {}
+    for table in context_tables.values():
+        for column in {column.lower() for column in table["columns"]}:
+            column_counts[column] = column_counts.get(column, 0) + 1
+    shared_columns = {column for column, count in column_counts.items() if count > 1}
+
+    mentioned = [
+        name for name, table in context_tables.items()
+        if _mentions_table(question_words, table, shared_columns)
+    ]
+    fk_hops = sum(
+        1 for name in mentioned for ref in context_tables[name]["references"]
+        if ref in mentioned and ref != name
+    )
+    aggregations = sum(1 for pattern in AGGREGATION_KEYWORDS if re.search(pattern, question_lower))
+    filters = sum(1 for pattern in FILTER_KEYWORDS if re.search(pattern, question_lower))
+    filters += sum(1 for pattern in VALUE_PATTERNS if re.search(pattern, question))
+
+    joins = len(mentioned) > 1 or fk_hops > 0
+    if joins and aggregations:
+        complexity = "complex"
+    elif joins:
+        complexity = "join"
+    elif aggregations:
+        complexity = "aggregation"
+    elif filters:
+        complexity = "simple_filter"
+    else:
+        complexity = "simple"
+
+    return {
+        "complexity": complexity,
+        "tables_mentioned": len(mentioned),
+        "fk_hops": fk_hops,
+        "aggregations": aggregations,
+        "filters": filters,
+    }
+
+
+def record_outcome(model_name, complexity, latency, success):
+    """Record the latency and validation outcome of one generation."""
+    with _stats_lock:
+        stats = _stats.setdefault((model_name, complexity), {"calls": 0, "successes": 0, "total_latency": 0.0})
+        stats["calls"] += 1
+        stats["successes"] += 1 if success else 0
+        stats["total_latency"] += latency
+
+
+def get_stats(model_name, complexity):
+    with _stats_lock:
+        stats = dict(_stats.get((model_name, complexity), {"calls": 0, "successes": 0, "total_latency": 0.0}))
+    calls = stats["calls"]
+    stats["success_rate"] = stats["successes"] / calls if calls else None
+    stats["avg_latency"] = round(stats["total_latency"] / calls, 3) if calls else None
+    return stats
+
+
+def get_all_stats():
+    """Return per-model, per-complexity stats, e.g. for a monitoring endpoint."""
+    with _stats_lock:
+        keys = list(_stats)
+    return [
+        {"model": model_name, "complexity": complexity, **get_stats(model_name, complexity)}
+        for model_name, complexity in sorted(keys)
+    ]
+
+
+def _is_unreliable(model_name, complexity):
+    stats = get_stats(model_name, complexity)
+    return stats["calls"] >= MIN_SAMPLES and stats["success_rate"] < MIN_SUCCESS_RATE
+
+
+def route_model(complexity, latency_budget=LATENCY_BUDGET):
+    """Pick a model from MODEL_LADDER for a question class.
+
+    Args:
+        complexity: Label returned by classify_question
+        latency_budget: Optional target generation time in seconds
+
+    Returns:
+        The Ollama model name to try first
+    """
+    tier = 0 if complexity in SIMPLE_COMPLEXITIES else len(MODEL_LADDER) - 1
+
+    # Skip models that keep failing this kind of question
+    while tier < len(MODEL_LADDER) - 1 and _is_unreliable(MODEL_LADDER[tier], complexity):
+        tier += 1
+
+    # Step down when the model is too slow for the budget and the smaller one is not known to fail
+    if latency_budget:
+        while tier > 0:
+            stats = get_stats(MODEL_LADDER[tier], complexity)
+            too_slow = stats["calls"] >= MIN_SAMPLES and stats["avg_latency"] > latency_budget
+            if not too_slow or _is_unreliable(MODEL_LADDER[tier - 1], complexity):
+                break
+            tier -= 1
+
+    return MODEL_LADDER[tier]
+
+
+def escalate_model(model_name):
+    """Return the next larger model, or None if model_name is already the largest."""
+    if model_name not in MODEL_LADDER:
+        return None
+    tier = MODEL_LADDER.index(model_name) + 1
+    return MODEL_LADDER[tier] if tier < len(MODEL_LADDER) else None
+
+
+def _is_valid_llm_output(llm_output):
+    return not is_llm_error(llm_output) and not extract_sql(llm_output).startswith("Error:")
+
+
+def generate_routed_sql(question, rag_context, get_connection, examples=None, num_candidates=1,
+                        repair=False, latency_budget=LATENCY_BUDGET):
+    """Generate SQL with the routed model, escalating to larger models on validation failure.
+
+    Args:
+        question: The user's natural language question
+        rag_context: Retrieved schema context
+        get_connection: Callable returning the database connection for EXPLAIN
+            validation (or None to skip it); only called once SQL exists, so the
+            connection can still be checking out while the first model generates
+        examples: Optional few-shot question->SQL pairs for the prompt
+        num_candidates: SQL candidates generated in parallel per model
+        repair: Run the sql_repair loop with each model before escalating
+        latency_budget: Optional target generation time in seconds
+
+    Returns:
+        Dict with sql_query, error (None on success), model, complexity,
+        features, models_tried, attempts, time_llm and time_repair
+    """
+    features = classify_question(question, rag_context)
+    complexity = features["complexity"]
+    result = {
+        "complexity": complexity,
+        "features": features,
+        "models_tried": [],
+        "attempts": [],
+        "time_llm": 0.0,
+        "time_repair": 0.0,
+    }
+
+    # Blocked questions and missing context never reach a model, so there is nothing to escalate
+    blocked = check_question(question, rag_context)
+    if blocked:
+        result.update(sql_query=blocked, error=blocked, model=None)
+        return result
+
+    model_name = route_model(complexity, latency_budget)
+    while model_name:
+        result["models_tried"].append(model_name)
+        time_start = time.time()
+        llm_output = ask_llm_candidates(
+            question, rag_context, model_name=model_name, num_candidates=num_candidates,
+            is_valid=_is_valid_llm_output, examples=examples
+        )
+        time_llm = round(time.time() - time_start, 3)
+        result["time_llm"] = round(result["time_llm"] + time_llm, 3)
+
+        sql_query = extract_sql(llm_output)
+        # A model that cannot be called is a failure of that model, not SQL to validate or repair
+        if is_llm_error(llm_output):
+            error = llm_output
+        else:
+            error = sql_query if sql_query.startswith("Error:") else None
+        connection = get_connection() if error is None else None
+        if error is None and connection:
+            if repair:
+                time_start_repair = time.time()
+                sql_query, error, attempts = repair_sql(
+                    question, rag_context, sql_query, connection,
+                    model_name=model_name, initial_time_llm=time_llm
+                )
+                result["time_repair"] = round(result["time_repair"] + time.time() - time_start_repair, 3)
+                result["attempts"].extend(dict(attempt, model=model_name) for attempt in attempts)
+            else:
+                error = validate_sql(sql_query, connection)
+
+        record_outcome(model_name, complexity, time.time() - time_start, error is None)
+        result.update(sql_query=sql_query, error=error, model=model_name)
+        if error is None:
+            break
+        model_name = escalate_model(model_name)
+        if model_name:
+            print(f"Escalating to {model_name}: {error}")
+
+    return result
@@ -1,5 +1,7 @@
 import re
 
+from db_driver import fetch_rows, open_cursor
+
 
 def extract_sql(text):
     """Extract SQL SELECT query from LLM output."""
@@ -61,17 +63,30 @@ def extract_sql(text):
     return extracted
 
 
-def run_query(sql_query, connection):
+def validate_sql(sql_query, connection):
+    """Dry-run a query with EXPLAIN. Returns None if valid, otherwise an 'Error:' string."""
     cursor = connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {sql_query.strip().rstrip(';')}")
+        cursor.fetchall()
+        return None
+    except Exception as error:
+        return f"Error: {error}"
+    finally:
+        cursor.close()
+
+
+def run_query(sql_query, connection):
+    cursor = open_cursor(connection, streaming=True)
     try:
         cursor.execute(sql_query)
-        rows = cursor.fetchall()
+        rows, truncated = fetch_rows(cursor)
         
         if not rows:
             return "No records."
         
         column_names = [desc[0] for desc in cursor.description]
-        return {"columns": column_names, "rows": rows}
+        return {"columns": column_names, "rows": rows, "truncated": truncated}
     except Exception as error:
         return f"Error: {error}"
     finally:
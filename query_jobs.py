@@ -0,0 +1,368 @@
+"""
+=============================================================================
+QUERY JOBS - Server-side asynchronous execution of generated SELECTs
+=============================================================================
+
+Long analytical queries should not block the HTTP request that generated
+them. The web application submits the generated SQL here, receives a job id
+and redirects the browser to a status page that polls for completion.
+
+- Each job runs on its own worker thread with its own database connection
+- Cancellation issues KILL QUERY for the job's connection id
+- Each user may only have MAX_JOBS_PER_USER jobs running at once (counted
+  per server process)
+- Job status is written to a state file next to the spilled results, so any
+  worker process of a multi-worker server can report and cancel a job that
+  another worker runs. Cancellation from another worker leaves a marker
+  file that the running worker checks
+- Finished results are spilled to a JSON file in SPILL_DIR (a private
+  directory in the user's home, like the other QueryMind stores) and
+  removed after JOB_TTL_SECONDS, so reloading the status page never re-runs
+  the query. SPILL_DIR is swept by file age, so files left by a restarted
+  process are removed as well
+=============================================================================
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import db_driver
+from query_executor import run_query
+
+MAX_JOBS_PER_USER = int(os.getenv("QUERYMIND_MAX_JOBS_PER_USER", "2"))
+JOB_TTL_SECONDS = int(os.getenv("QUERYMIND_JOB_TTL", "900"))
+SPILL_DIR = os.getenv("QUERYMIND_JOBS_DIR", os.path.expanduser("~/.querymind_jobs"))
+SWEEP_INTERVAL_SECONDS = 60
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+class JobLimitError(Exception):
+    """Raised when a user already has MAX_JOBS_PER_USER jobs running."""
+
+
+PUBLIC_FIELDS = (
+    "id", "status", "sql_query", "error", "row_count", "truncated",
+    "submitted_at", "finished_at", "time_execution", "meta",
+)
+# Written to the state file; never the credentials in kill_params
+STATE_FIELDS = PUBLIC_FIELDS + ("owner", "spill_path", "connection_id")
+
+
+def _public_view(job):
+    """Return the JSON-safe part of a job (no credentials, no file paths)."""
+    return {field: job[field] for field in PUBLIC_FIELDS}
+
+
+def _ensure_spill_dir():
+    os.makedirs(SPILL_DIR, mode=0o700, exist_ok=True)
+    # makedirs only applies the mode when it creates the directory
+    os.chmod(SPILL_DIR, 0o700)
+
+
+def _valid_job_id(job_id):
+    return bool(re.fullmatch(r"[0-9a-f]{32}", job_id or ""))
+
+
+def _state_path(job_id):
+    return os.path.join(SPILL_DIR, f"{job_id}.state.json")
+
+
+def _cancel_path(job_id):
+    return os.path.join(SPILL_DIR, f"{job_id}.cancel")
+
+
+def _spill_results(job_id, results):
+    """Write query results to SPILL_DIR and return the file path."""
+    _ensure_spill_dir()
+    spill_path = os.path.join(SPILL_DIR, f"{job_id}.json")
+    with open(spill_path, "w") as file:
+        json.dump(results, file, default=str)
+    return spill_path
+
+
+def _persist(job_id):
+    """Write the job's current status to its state file for the other worker processes."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return
+        state = {field: job[field] for field in STATE_FIELDS}
+
+    try:
+        _ensure_spill_dir()
+        tmp_path = f"{_state_path(job_id)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(state, file, default=str)
+        os.replace(tmp_path, _state_path(job_id))
+    except OSError as e:
+        print(f"Warning: Could not write state of job {job_id}: {e}")
+
+
+def _load_state(job_id):
+    if not _valid_job_id(job_id):
+        return None
+    try:
+        with open(_state_path(job_id)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _find_job(job_id, owner):
+    """Return the job's state from this process, or from its state file if another worker runs it."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job:
+            return {field: job[field] for field in STATE_FIELDS} if job["owner"] == owner else None
+
+    state = _load_state(job_id)
+    if state and state["owner"] == owner:
+        return state
+    return None
+
+
+def _still_running(job_id, connection_id):
+    """True if the job still runs its query on connection_id (checked right before KILL QUERY)."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job:
+            return job["status"] == JOB_RUNNING and job["connection_id"] == connection_id
+
+    state = _load_state(job_id)
+    return bool(state) and state["status"] == JOB_RUNNING and state["connection_id"] == connection_id
+
+
+def _run_job(job_id, db_params, conn=None, on_success=None):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job or job["status"] == JOB_CANCELLED:
+            if conn:
+                conn.close()
+            return
+        job["status"] = JOB_RUNNING
+    _persist(job_id)
+
+    try:
+        if conn is None:
+            conn = db_driver.connect(db_params, pooled=False)
+        cursor = conn.cursor()
+        cursor.execute("SELECT CONNECTION_ID();")
+        connection_id = cursor.fetchone()[0]
+        cursor.close()
+
+        with _jobs_lock:
+            job["connection_id"] = connection_id
+            cancel_requested = job["cancel_requested"] or os.path.exists(_cancel_path(job_id))
+        _persist(job_id)
+        if cancel_requested:
+            return
+
+        time_start_exec = time.time()
+        results = run_query(job["sql_query"], conn)
+        time_execution = round(time.time() - time_start_exec, 3)
+
+        succeeded = not (isinstance(results, str) and results.startswith("Error:"))
+        # Write results before taking the lock so large result sets do not block other requests
+        spill_path = _spill_results(job_id, results) if succeeded else None
+        cancelled_elsewhere = os.path.exists(_cancel_path(job_id))
+
+        with _jobs_lock:
+            job["time_execution"] = time_execution
+            if job["cancel_requested"] or cancelled_elsewhere:
+                job["status"] = JOB_CANCELLED
+            elif not succeeded:
+                job["status"] = JOB_FAILED
+                job["error"] = results
+            else:
+                job["row_count"] = len(results["rows"]) if isinstance(results, dict) else 0
+                job["truncated"] = isinstance(results, dict) and results.get("truncated", False)
+                job["spill_path"] = spill_path
+                job["status"] = JOB_DONE
+
+        if on_success and job["status"] == JOB_DONE and job["row_count"] > 0:
+            try:
+                on_success(job["sql_query"])
+            except Exception as e:
+                print(f"Job {job_id} success callback failed: {e}")
+    except Exception as e:
+        print(f"Job {job_id} error: {e}")
+        with _jobs_lock:
+            job["status"] = JOB_FAILED
+            job["error"] = "Error executing query."
+    finally:
+        if conn:
+            conn.close()
+        with _jobs_lock:
+            if job["status"] not in FINISHED_STATES:
+                job["status"] = JOB_CANCELLED
+            job["finished_at"] = time.time()
+            job["connection_id"] = None
+        _persist(job_id)
+
+
+def _sweep_spill_dir(now):
+    """Delete spill files older than JOB_TTL_SECONDS, including ones left by a previous process."""
+    global _last_sweep
+    if now - _last_sweep < SWEEP_INTERVAL_SECONDS or not os.path.isdir(SPILL_DIR):
+        return
+    _last_sweep = now
+
+    for name in os.listdir(SPILL_DIR):
+        path = os.path.join(SPILL_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > JOB_TTL_SECONDS:
+                os.remove(path)
+        except OSError as e:
+            print(f"Warning: Could not remove {path}: {e}")
+
+
+def cleanup_expired_jobs():
+    """Drop finished jobs older than JOB_TTL_SECONDS and delete expired spill files."""
+    now = time.time()
+    expired = 0
+    with _jobs_lock:
+        for job_id, job in list(_jobs.items()):
+            if job["finished_at"] and now - job["finished_at"] > JOB_TTL_SECONDS:
+                del _jobs[job_id]
+                expired += 1
+
+    _sweep_spill_dir(now)
+    return expired
+
+
+def submit_job(sql_query, db_params, owner, meta=None, conn=None, on_success=None):
+    """Start executing sql_query in the background and return the new job id.
+
+    Args:
+        sql_query: Validated SELECT statement to execute
+        db_params: Connection parameters for db_driver.connect
+        owner: Identifier of the submitting user, used for limits and access
+        meta: Optional dict stored with the job (question, timings, ...)
+        conn: Optional already-open connection; the job takes ownership of it.
+            It must not be pooled (db_driver.connect(..., pooled=False)), since
+            cancelling the job kills the query on this connection.
+        on_success: Optional callable invoked with the SQL once it returned rows
+
+    Raises:
+        JobLimitError: If the owner already has MAX_JOBS_PER_USER active jobs
+    """
+    cleanup_expired_jobs()
+
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        active = sum(
+            1 for job in _jobs.values()
+            if job["owner"] == owner and job["status"] not in FINISHED_STATES
+        )
+        if active >= MAX_JOBS_PER_USER:
+            raise JobLimitError(
+                f"You already have {active} queries running. Please wait for them to finish."
+            )
+
+        _jobs[job_id] = {
+            "id": job_id,
+            "owner": owner,
+            "status": JOB_PENDING,
+            "sql_query": sql_query,
+            "error": "",
+            "row_count": 0,
+            "truncated": False,
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "time_execution": 0,
+            "connection_id": None,
+            "cancel_requested": False,
+            "spill_path": None,
+            "kill_params": dict(db_params),
+            "meta": meta or {},
+        }
+    _persist(job_id)
+
+    worker = threading.Thread(target=_run_job, args=(job_id, dict(db_params), conn, on_success), daemon=True)
+    worker.start()
+    return job_id
+
+
+def get_job(job_id, owner):
+    """Return the public view of a job, or None if it is unknown or not owned by owner."""
+    cleanup_expired_jobs()
+    job = _find_job(job_id, owner)
+    return _public_view(job) if job else None
+
+
+def load_job_results(job_id, owner):
+    """Read the spilled results of a finished job, or None if not available."""
+    job = _find_job(job_id, owner)
+    if not job or not job["spill_path"]:
+        return None
+
+    try:
+        with open(job["spill_path"]) as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Could not read results for job {job_id}: {e}")
+        return None
+
+
+def cancel_job(job_id, owner, db_params=None):
+    """Cancel a pending or running job. Returns True if the job was found.
+
+    db_params are the caller's credentials, used to kill a query that another
+    worker process runs (credentials are never written to the state file).
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job and job["owner"] != owner:
+            return False
+        if job:
+            if job["status"] in FINISHED_STATES:
+                return True
+            job["cancel_requested"] = True
+            connection_id = job["connection_id"]
+            kill_params = job["kill_params"]
+            if job["status"] == JOB_PENDING:
+                job["status"] = JOB_CANCELLED
+                job["finished_at"] = time.time()
+
+    if job:
+        _persist(job_id)
+    else:
+        state = _find_job(job_id, owner)
+        if not state:
+            return False
+        if state["status"] in FINISHED_STATES:
+            return True
+        # Another worker runs this job: leave a marker it checks before and after executing
+        _ensure_spill_dir()
+        open(_cancel_path(job_id), "w").close()
+        connection_id = state["connection_id"]
+        kill_params = db_params
+
+    if connection_id and kill_params:
+        try:
+            conn = db_driver.connect(kill_params)
+            try:
+                # The job may have finished while connecting; only kill if it still runs on that connection
+                if _still_running(job_id, connection_id):
+                    cursor = conn.cursor()
+                    cursor.execute(f"KILL QUERY {int(connection_id)};")
+                    cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Could not kill query for job {job_id}: {e}")
+    return True
@@ -0,0 +1,91 @@
+"""
+=============================================================================
+SQL REPAIR - Self-correcting generation loop using database error feedback
+=============================================================================
+
+Generated SQL is dry-run with EXPLAIN before it is executed. If the database
+rejects it, the error and the already-retrieved schema context are sent back
+to the model in a short follow-up prompt, without repeating retrieval.
+Retries stop after REPAIR_MAX_ATTEMPTS attempts or REPAIR_TIME_BUDGET seconds,
+or as soon as the model cannot be called at all.
+=============================================================================
+"""
+
+import os
+import time
+
+from llm_engine import ask_llm_repair, check_question, is_llm_error
+from query_executor import extract_sql, validate_sql
+
+REPAIR_MAX_ATTEMPTS = int(os.getenv("QUERYMIND_REPAIR_MAX_ATTEMPTS", "3"))
+REPAIR_TIME_BUDGET = float(os.getenv("QUERYMIND_REPAIR_TIME_BUDGET", "60"))
+
+
+def repair_sql(question, rag_context, sql_query, connection, model_name,
+               max_attempts=REPAIR_MAX_ATTEMPTS, time_budget=REPAIR_TIME_BUDGET,
+               initial_time_llm=0.0):
+    """Validate sql_query and ask the model to fix it until it passes or the budget runs out.
+
+    Args:
+        question: The user's natural language question
+        rag_context: Schema context already retrieved for the question
+        sql_query: SQL extracted from the first LLM answer
+        connection: Open database connection used for the EXPLAIN dry run
+        model_name: Ollama model used for repairs
+        max_attempts: Total attempts including the original query
+        time_budget: Seconds after which no further repair is requested
+        initial_time_llm: Generation time of sql_query, recorded on the first attempt
+
+    Returns:
+        Tuple (sql_query, error, attempts) where error is None if the final
+        query passed validation, and attempts is a list of per-attempt dicts
+        with the SQL, its validation error and timings
+    """
+    blocked = check_question(question, rag_context)
+    if blocked:
+        return sql_query, blocked, []
+
+    time_start = time.time()
+    attempts = []
+    time_llm = initial_time_llm
+    failed_sql = sql_query
+
+    for attempt in range(1, max_attempts + 1):
+        time_start_validate = time.time()
+        if sql_query.startswith("Error:"):
+            # The model answered with something that is not a SELECT; repair the last real query
+            error = sql_query
+        else:
+            failed_sql = sql_query
+            error = validate_sql(sql_query, connection)
+        time_validate = round(time.time() - time_start_validate, 3)
+
+        attempts.append({
+            "attempt": attempt,
+            "sql": sql_query,
+            "error": error,
+            "time_llm": time_llm,
+            "time_validate": time_validate,
+        })
+
+        if error is None:
+            return sql_query, None, attempts
+        if attempt == max_attempts or time.time() - time_start > time_budget:
+            break
+
+        time_start_llm = time.time()
+        llm_output = ask_llm_repair(question, rag_context, failed_sql, error, model_name)
+        time_llm = round(time.time() - time_start_llm, 3)
+        if is_llm_error(llm_output):
+            # Further attempts with this model cannot succeed; keep the last real query
+            attempts.append({
+                "attempt": attempt + 1,
+                "sql": failed_sql,
+                "error": llm_output,
+                "time_llm": time_llm,
+                "time_validate": 0.0,
+            })
+            return failed_sql, llm_output, attempts
+        sql_query = extract_sql(llm_output)
+
+    return sql_query, error, attempts